@@ -0,0 +1,419 @@
+import csv
+import io
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from chardet import UniversalDetector
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking outside Unix
+    fcntl = None
+
+MODE_FULL = 'full'
+MODE_DOWNSAMPLE = 'downsample'
+MODE_LOW_MEMORY = 'low_memory'
+
+SNIFF_BYTES = 65536
+
+# Cost model, calibrated with DataAnalyzer.run_analysis on the synthetic benchmark
+# datasets (benchmarks/datasets.py) at 100k-400k rows:
+# - parsing peaks at about the raw bytes plus 2-2.5x the parsed frame,
+# - a full analysis peaks at about the raw bytes plus 6-6.5x the parsed frame
+#   (original and processed frames, conversion temporaries, plotting).
+PARSE_FACTOR = 2.5
+ANALYSIS_FACTOR = 6.5
+FIXED_OVERHEAD = 32 * 1024 * 1024
+EXCEL_EXPANSION = 10 # Parsed frame size relative to the (compressed) .xlsx file
+LOW_MEMORY_CHUNK_ROWS = 50_000
+# Data parsed under a reservation may exceed the sniffed frame size by this factor
+# (the estimate's error) before the reservation counts as too small for it
+ESTIMATE_TOLERANCE = 1.2
+MIN_SAMPLE_ROWS = 1000
+
+RESERVATION_PATTERN = re.compile(r'^(res|queue)_(\d+)_([0-9a-f]{32})$')
+
+
+class AdmissionRejected(Exception):
+    """Raised when an upload cannot be analysed within the memory budgets (413) or not right now (503)."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _sniff_format(head):
+    detector = UniversalDetector()
+    detector.feed(head)
+    detector.close()
+    encoding = normalize_encoding(detector.result['encoding'])
+    try:
+        sample = head.decode(encoding, errors='ignore').splitlines(True)[:5]
+        delimiter = csv.Sniffer().sniff(''.join(sample)).delimiter
+    except csv.Error:
+        delimiter = ','
+    return encoding, delimiter
+
+
+def normalize_encoding(encoding):
+    """
+    The encoding to read a file with, given chardet's guess from its first bytes.
+    An ASCII guess is read as UTF-8 (a superset), since later bytes need not be ASCII.
+    """
+    if not encoding or encoding.lower() == 'ascii':
+        return 'utf-8'
+    return encoding
+
+
+def detect_file_encoding(source, block_size=SNIFF_BYTES):
+    """
+    Runs chardet over the whole file (a path or a seekable binary file, read from the start),
+    for when the encoding guessed from its head fails to decode it.
+    chardet stops after its first max_bytes, so only the blocks holding non-ASCII bytes
+    (extended to whole lines) are fed; the ASCII ones say nothing about the encoding.
+    """
+    detector = UniversalDetector()
+    f = source if hasattr(source, 'read') else open(source, 'rb')
+    try:
+        f.seek(0)
+        for block in iter(lambda: f.read(block_size), b''):
+            if block.isascii():
+                continue
+            detector.feed(block + f.readline())
+            if detector.done:
+                break
+    finally:
+        if f is not source:
+            f.close()
+    detector.close()
+    return normalize_encoding(detector.result['encoding'])
+
+
+def estimate_upload(file_type, file_bytes, head):
+    """
+    Estimates the in-memory size of an upload before it is parsed.
+    - CSV: parses the complete lines of the first bytes, extrapolates the row
+      count from their average length and the frame size from their deep
+      memory usage (which reflects the dtypes pandas infers).
+    - Excel: cannot be sniffed cheaply, so the frame size is derived from the
+      file size.
+    """
+    estimate = {
+        'file_type': file_type,
+        'file_bytes': file_bytes,
+        'rows': None,
+        'columns': None,
+        'row_bytes': None,
+        'frame_bytes': file_bytes * EXCEL_EXPANSION,
+        'dtypes': {},
+        'encoding': None,
+        'delimiter': None,
+    }
+    if file_type != 'csv':
+        return estimate
+
+    encoding, delimiter = _sniff_format(head)
+    estimate.update(encoding=encoding, delimiter=delimiter)
+    complete = head if len(head) >= file_bytes else head[:head.rfind(b'\n') + 1]
+    try:
+        frame = pd.read_csv(io.BytesIO(complete), sep=delimiter, encoding=encoding)
+    except Exception as e:
+        logging.info(f"Could not sniff upload for admission control ({e}); estimating from the file size.")
+        estimate['frame_bytes'] = file_bytes * PARSE_FACTOR
+        return estimate
+
+    header_bytes = complete.find(b'\n') + 1
+    sampled_rows = max(len(frame), 1)
+    line_bytes = max((len(complete) - header_bytes) / sampled_rows, 1)
+    rows = max(len(frame), int((file_bytes - header_bytes) / line_bytes))
+    row_bytes = frame.memory_usage(deep=True, index=False).sum() / sampled_rows
+    estimate.update(
+        rows=rows,
+        columns=len(frame.columns),
+        row_bytes=int(row_bytes),
+        frame_bytes=int(rows * row_bytes),
+        dtypes=frame.dtypes.astype(str).value_counts().to_dict(),
+    )
+    return estimate
+
+
+def plan_cost(estimate, mode, sample_rows=None):
+    """Estimated peak memory (bytes) of analysing the upload in the given mode."""
+    file_bytes, frame_bytes = estimate['file_bytes'], estimate['frame_bytes']
+    if mode == MODE_FULL:
+        return int(file_bytes + ANALYSIS_FACTOR * frame_bytes + FIXED_OVERHEAD)
+    sample_bytes = sample_rows * estimate['row_bytes']
+    if mode == MODE_DOWNSAMPLE:
+        parse = file_bytes + PARSE_FACTOR * frame_bytes
+        return int(max(parse, frame_bytes + ANALYSIS_FACTOR * sample_bytes) + FIXED_OVERHEAD)
+    chunk_bytes = LOW_MEMORY_CHUNK_ROWS * estimate['row_bytes']
+    return int(PARSE_FACTOR * chunk_bytes + (1 + ANALYSIS_FACTOR) * sample_bytes + FIXED_OVERHEAD)
+
+
+def read_csv_sample(source, estimate, sample_rows, random_state=0):
+    """
+    Low-memory read: streams the CSV in chunks and keeps a uniform random
+    sample of about sample_rows rows, so the full frame is never in memory.
+    Returns the sample and the total number of rows.
+    The encoding was sniffed from the head of the file only; if a later chunk
+    does not decode, it is re-detected over the whole file and the read restarts.
+    """
+    encoding = normalize_encoding(estimate['encoding'])
+    try:
+        return _read_csv_sample(source, estimate, sample_rows, encoding, random_state)
+    except UnicodeDecodeError as e:
+        detected = detect_file_encoding(source)
+        if detected == encoding:
+            raise
+        logging.info(f"Upload is not {encoding} throughout ({e}); reading it as {detected}.")
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return _read_csv_sample(source, estimate, sample_rows, detected, random_state)
+
+
+def _read_csv_sample(source, estimate, sample_rows, encoding, random_state):
+    fraction = min(1.0, sample_rows / max(estimate['rows'] or 1, 1))
+    rng = np.random.default_rng(random_state)
+    parts = []
+    total_rows = 0
+    reader = pd.read_csv(source, sep=estimate['delimiter'] or ',', encoding=encoding,
+                         chunksize=LOW_MEMORY_CHUNK_ROWS)
+    for chunk in reader:
+        total_rows += len(chunk)
+        parts.append(chunk[rng.random(len(chunk)) < fraction])
+    if not parts:
+        return pd.DataFrame(), 0
+    sample = pd.concat(parts)
+    if len(sample) > sample_rows:
+        sample = sample.sample(sample_rows, random_state=random_state).sort_index()
+    return sample, total_rows
+
+
+class Reservation:
+    """Memory reserved for one analysis. Release it when the analysis ends."""
+
+    def __init__(self, path, mode, cost, sample_rows, estimate):
+        self.path = path
+        self.mode = mode
+        self.cost = cost
+        self.sample_rows = sample_rows
+        self.estimate = estimate
+        self._released = False
+
+    def frame_allowance(self):
+        """
+        Largest parsed frame (bytes) the reserved memory covers in full or downsample
+        mode, i.e. plan_cost solved for the frame size, times ESTIMATE_TOLERANCE;
+        None in low-memory mode.
+        """
+        spare = self.cost - FIXED_OVERHEAD - self.estimate['file_bytes']
+        if self.mode == MODE_FULL:
+            frame_bytes = spare / ANALYSIS_FACTOR
+        elif self.mode == MODE_DOWNSAMPLE:
+            sample_bytes = self.sample_rows * self.estimate['row_bytes']
+            frame_bytes = min(spare / PARSE_FACTOR, self.cost - FIXED_OVERHEAD - ANALYSIS_FACTOR * sample_bytes)
+        else:
+            return None
+        return int(frame_bytes * ESTIMATE_TOLERANCE)
+
+    def transfer(self):
+        """Hands the reservation to a new owner (e.g. a background job); releasing this one is then a no-op."""
+        other = Reservation(self.path, self.mode, self.cost, self.sample_rows, self.estimate)
+        self._released = True
+        return other
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.path.unlink(missing_ok=True)
+        metrics.ADMISSION_RESERVED_BYTES.dec(self.cost)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Plans each upload against a per-process and a global memory budget:
+    - full analysis if it fits,
+    - else downsample: parse everything but analyse a bounded sample,
+    - else low memory: stream-read just a sample of the CSV rows,
+    - else reject.
+    Reservations are files in a shared directory (one per running analysis,
+    named after the owning process), so every gunicorn worker sees the global
+    usage. If the plan does not fit next to the running analyses, the upload
+    waits in the queue until memory frees up or the queue timeout expires.
+    """
+
+    def __init__(self, root, process_budget, global_budget, queue_timeout=30, max_sample_rows=20000, poll_interval=0.25):
+        self.root = Path(root)
+        self.process_budget = process_budget
+        self.global_budget = global_budget
+        self.queue_timeout = queue_timeout
+        self.max_sample_rows = max_sample_rows
+        self.poll_interval = poll_interval
+
+    def plan(self, estimate):
+        """Picks the cheapest-degrading mode that fits the budgets: (mode, cost, sample_rows)."""
+        budget = min(self.process_budget, self.global_budget)
+        cost = plan_cost(estimate, MODE_FULL)
+        if cost <= budget:
+            return MODE_FULL, cost, None
+
+        # Without a sniffed row size (Excel) a sample's cost is unknown
+        modes = [MODE_DOWNSAMPLE, MODE_LOW_MEMORY] if estimate['row_bytes'] else []
+        for mode in modes:
+            sample_rows = self.max_sample_rows
+            if estimate['rows']:
+                sample_rows = min(sample_rows, estimate['rows'])
+            while sample_rows >= MIN_SAMPLE_ROWS:
+                cost = plan_cost(estimate, mode, sample_rows)
+                if cost <= budget:
+                    return mode, cost, sample_rows
+                sample_rows //= 2
+        raise AdmissionRejected(
+            f"This file is too large to analyse on this server (estimated {plan_cost(estimate, MODE_FULL) / 2**20:,.0f} MiB "
+            f"for a full analysis, budget {budget / 2**20:,.0f} MiB).", status=413)
+
+    def admit(self, estimate, wait=True):
+        """
+        Plans the upload and reserves its memory, queueing while the budgets are in use.
+        Without wait, returns None instead of queueing.
+        """
+        try:
+            mode, cost, sample_rows = self.plan(estimate)
+        except AdmissionRejected:
+            metrics.ADMISSION_DECISIONS.labels('rejected').inc()
+            raise
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        queue_path = None
+        try:
+            while True:
+                path = self._try_reserve(cost)
+                if path:
+                    break
+                if not wait:
+                    return None
+                if queue_path is None:
+                    queue_path = self.root / f"queue_{os.getpid()}_{uuid.uuid4().hex}"
+                    queue_path.write_text('0')
+                    logging.info(f"Upload queued for {cost / 2**20:,.0f} MiB of memory.")
+                if time.monotonic() - start > self.queue_timeout:
+                    metrics.ADMISSION_DECISIONS.labels('timeout').inc()
+                    raise AdmissionRejected("The server is busy with other analyses. Please try again in a minute.", status=503)
+                time.sleep(self.poll_interval)
+        finally:
+            if queue_path:
+                queue_path.unlink(missing_ok=True)
+
+        waited = time.monotonic() - start
+        metrics.ADMISSION_DECISIONS.labels(mode).inc()
+        metrics.ADMISSION_QUEUE_SECONDS.observe(waited)
+        metrics.ADMISSION_RESERVED_BYTES.inc(cost)
+        logging.info(f"Admitted upload in {mode} mode ({cost / 2**20:,.0f} MiB reserved"
+                     f"{f', {sample_rows} sample rows' if sample_rows else ''}, waited {waited:.1f}s).")
+        return Reservation(path, mode, cost, sample_rows, estimate)
+
+    def usage(self):
+        """Current budgets, reservations and queue length (bytes)."""
+        entries = self._entries()
+        pid = os.getpid()
+        reserved = [(owner, cost) for kind, owner, cost in entries if kind == 'res']
+        return {
+            'process_budget_bytes': self.process_budget,
+            'global_budget_bytes': self.global_budget,
+            'process_reserved_bytes': sum(cost for owner, cost in reserved if owner == pid),
+            'global_reserved_bytes': sum(cost for _, cost in reserved),
+            'running': len(reserved),
+            'queued': sum(1 for kind, _, _ in entries if kind == 'queue'),
+        }
+
+    def _try_reserve(self, cost):
+        with self._lock():
+            usage = self.usage()
+            if usage['process_reserved_bytes'] + cost > self.process_budget \
+                    or usage['global_reserved_bytes'] + cost > self.global_budget:
+                return None
+            path = self.root / f"res_{os.getpid()}_{uuid.uuid4().hex}"
+            path.write_text(str(cost))
+            return path
+
+    def _entries(self):
+        """(kind, pid, cost) of every live reservation/queue entry; entries of dead processes are removed."""
+        entries = []
+        if not self.root.exists():
+            return entries
+        for entry in self.root.iterdir():
+            match = RESERVATION_PATTERN.match(entry.name)
+            if not match:
+                continue
+            kind, pid = match.group(1), int(match.group(2))
+            if not _pid_alive(pid):
+                entry.unlink(missing_ok=True)
+                continue
+            try:
+                entries.append((kind, pid, int(entry.read_text() or 0)))
+            except (OSError, ValueError):
+                continue # released meanwhile
+        return entries
+
+    def _lock(self):
+        return _FileLock(self.root / '.lock')
+
+
+class _FileLock:
+    """Serialises check-and-reserve across threads and (on Unix) worker processes."""
+    _thread_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self._thread_lock.release()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def default_controller():
+    from django.conf import settings
+    return AdmissionController(
+        settings.ADMISSION_ROOT,
+        settings.ADMISSION_PROCESS_BUDGET_MB * 1024 * 1024,
+        settings.ADMISSION_GLOBAL_BUDGET_MB * 1024 * 1024,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        max_sample_rows=settings.PROGRESSIVE_SAMPLE_SIZE,
+    )
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+ARTIFACT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+ORIGINAL_FILE = 'original.parquet'
+DELTA_FILE = 'processed_delta.parquet'
+MANIFEST_FILE = 'manifest.json'
+CHARTS_DIR = 'charts'
+CHART_FILE_PATTERN = re.compile(r'^[0-9a-f]{32}\.(png|webp|svg)$')
+# Row groups are the unit a row range can be read by (see _read_parquet_rows)
+ROW_GROUP_ROWS = 100_000
+
+
+class ArtifactStore:
+    """
+    Stores uploaded and processed data on disk as Parquet.
+    - The original upload is written once.
+    - The processed data is written as a delta: only the columns the pipeline
+      changed or added, plus a manifest with the processed column order.
+      Unchanged columns are read back from the original file on demand.
+    - If the processed rows differ from the original rows (e.g. a sample-first
+      result), the processed data is stored in full instead.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, artifact_id):
+        if not ARTIFACT_ID_PATTERN.match(str(artifact_id)):
+            raise ValueError(f"Invalid artifact id: {artifact_id!r}")
+        return self.root / artifact_id
+
+    def exists(self, artifact_id):
+        return (self._path(artifact_id) / ORIGINAL_FILE).exists()
+
+    def save_original(self, df):
+        """Writes the original upload and returns its new artifact id."""
+        artifact_id = uuid.uuid4().hex
+        path = self._path(artifact_id)
+        path.mkdir(parents=True, exist_ok=True)
+        _write_parquet(_to_storable(df), path / ORIGINAL_FILE)
+        logging.info(f"Stored original data as artifact {artifact_id} ({df.shape[0]} rows, {df.shape[1]} columns).")
+        return artifact_id
+
+    def save_processed(self, artifact_id, original_df, processed_df):
+        """Writes the processed data as a column delta against the stored original."""
+        path = self._path(artifact_id)
+        processed = _to_storable(processed_df)
+        original = _to_storable(original_df)
+
+        if processed.index.equals(original.index):
+            changed = [col for col in processed.columns if not _same_column(original, processed, col)]
+            manifest = {'mode': 'delta', 'columns': list(processed.columns), 'changed': changed}
+            delta = processed[changed]
+        else:
+            manifest = {'mode': 'full', 'columns': list(processed.columns), 'changed': list(processed.columns)}
+            delta = processed
+
+        _write_parquet(delta, path / DELTA_FILE)
+        _write_json(manifest, path / MANIFEST_FILE)
+        logging.info(f"Stored processed data for artifact {artifact_id} ({manifest['mode']}, "
+                     f"{len(manifest['changed'])} of {len(manifest['columns'])} columns).")
+        return manifest
+
+    def load_original(self, artifact_id, columns=None, offset=0, limit=None):
+        return _read_parquet_rows(self._path(artifact_id) / ORIGINAL_FILE, columns, offset, limit)
+
+    def load_processed(self, artifact_id, columns=None, offset=0, limit=None):
+        """
+        Rebuilds the processed data from the delta and the original's unchanged columns.
+        With offset/limit only that row range is read from either file.
+        """
+        path = self._path(artifact_id)
+        with open(path / MANIFEST_FILE, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        if columns is None:
+            wanted = manifest['columns']
+        else:
+            requested = set(columns)
+            wanted = [col for col in manifest['columns'] if col in requested]
+        changed = set(manifest['changed'])
+        from_delta = [col for col in wanted if col in changed]
+        from_original = [col for col in wanted if col not in changed]
+
+        delta = _read_parquet_rows(path / DELTA_FILE, from_delta, offset, limit)
+        if not from_original:
+            return delta[wanted]
+        original = _read_parquet_rows(path / ORIGINAL_FILE, from_original, offset, limit)
+        if not from_delta:
+            return original[wanted]
+        return pd.concat([original, delta], axis=1)[wanted]
+
+    def save_charts(self, artifact_id, plots):
+        """
+        Writes the chart images next to the data and returns the plots without their
+        bytes, each with the 'file' it was saved as. Files are named by content hash,
+        so charts of an earlier (sample) result stay valid while a later run adds its own.
+        """
+        path = self._path(artifact_id) / CHARTS_DIR
+        path.mkdir(parents=True, exist_ok=True)
+        stored = []
+        for plot in plots:
+            plot = dict(plot)
+            image = plot.pop('image')
+            plot['file'] = f"{hashlib.sha256(image).hexdigest()[:32]}.{plot['format']}"
+            if not (path / plot['file']).exists():
+                _write_bytes(image, path / plot['file'])
+            stored.append(plot)
+        return stored
+
+    def load_chart(self, artifact_id, plot):
+        """The image bytes of a plot returned by save_charts."""
+        if not CHART_FILE_PATTERN.match(str(plot.get('file'))):
+            raise ValueError(f"Invalid chart file: {plot.get('file')!r}")
+        return (self._path(artifact_id) / CHARTS_DIR / plot['file']).read_bytes()
+
+    def column_names(self, artifact_id, processed=False):
+        """Column names of the stored original or processed data, read from metadata only."""
+        path = self._path(artifact_id)
+        if processed:
+            with open(path / MANIFEST_FILE, encoding='utf-8') as f:
+                return json.load(f)['columns']
+        return pq.read_schema(path / ORIGINAL_FILE).names
+
+    def row_count(self, artifact_id, processed=False):
+        """Number of rows of the stored original or processed data, read from metadata only."""
+        path = self._path(artifact_id)
+        name = ORIGINAL_FILE
+        if processed:
+            with open(path / MANIFEST_FILE, encoding='utf-8') as f:
+                if json.load(f)['mode'] == 'full':
+                    name = DELTA_FILE
+        return pq.ParquetFile(path / name).metadata.num_rows
+
+    def version(self, artifact_id):
+        """A token that changes whenever the artifact's files are rewritten (for ETags)."""
+        path = self._path(artifact_id)
+        return '-'.join(str((path / name).stat().st_mtime_ns) if (path / name).exists() else '0'
+                        for name in (ORIGINAL_FILE, MANIFEST_FILE))
+
+    def delete(self, artifact_id):
+        shutil.rmtree(self._path(artifact_id), ignore_errors=True)
+
+    def purge_expired(self, max_age_seconds, in_use=None):
+        """
+        Deletes artifacts older than max_age_seconds. in_use, if given, is called
+        (only when there are such artifacts) for the ids still referenced, which are kept.
+        """
+        if not self.root.exists():
+            return
+        cutoff = time.time() - max_age_seconds
+        expired = [entry for entry in self.root.iterdir()
+                   if entry.is_dir() and ARTIFACT_ID_PATTERN.match(entry.name) and entry.stat().st_mtime < cutoff]
+        keep = in_use() if expired and in_use else set()
+        for entry in expired:
+            if entry.name not in keep:
+                shutil.rmtree(entry, ignore_errors=True)
+
+
+def default_store():
+    from django.conf import settings
+    return ArtifactStore(settings.ARTIFACT_ROOT)
+
+
+def session_artifact_ids():
+    """Artifact ids referenced by unexpired sessions; an artifact lives as long as its session."""
+    from django.contrib.sessions.models import Session
+    from django.utils import timezone
+    ids = set()
+    for session in Session.objects.filter(expire_date__gt=timezone.now()).iterator():
+        artifact_id = session.get_decoded().get('artifact_id')
+        if artifact_id:
+            ids.add(artifact_id)
+    return ids
+
+
+def _to_storable(df):
+    """Parquet needs unique string column names and single-typed columns."""
+    if not all(isinstance(col, str) for col in df.columns):
+        df = df.rename(columns=str)
+    mixed = [col for col in df.select_dtypes(include='object').columns
+             if pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty')]
+    if mixed:
+        df = df.assign(**{col: df[col].where(df[col].isna(), df[col].astype(str)) for col in mixed})
+    return df
+
+
+def _same_column(original, processed, col):
+    if col not in original.columns:
+        return False
+    before, after = original[col], processed[col]
+    # Copy-on-Write leaves untouched columns sharing one buffer; skip the comparison
+    if before.dtype == after.dtype and isinstance(before.dtype, np.dtype) and before.dtype != object \
+            and np.shares_memory(before.to_numpy(), after.to_numpy()):
+        return True
+    return before.equals(after)
+
+
+def _read_parquet_rows(path, columns=None, offset=0, limit=None):
+    """Rows [offset, offset + limit) of a Parquet file; only the row groups holding them are decoded."""
+    if offset == 0 and limit is None:
+        return pd.read_parquet(path, columns=columns)
+    parquet = pq.ParquetFile(path)
+    end = parquet.metadata.num_rows if limit is None else offset + limit
+    groups = []
+    first_row = start = 0
+    for index in range(parquet.num_row_groups):
+        rows = parquet.metadata.row_group(index).num_rows
+        if start < end and start + rows > offset:
+            if not groups:
+                first_row = start
+            groups.append(index)
+        start += rows
+    table = parquet.read_row_groups(groups, columns=columns)
+    return table.slice(max(offset - first_row, 0), end - offset).to_pandas()
+
+
+def _write_parquet(df, target):
+    tmp = target.with_suffix('.tmp')
+    df.to_parquet(tmp, index=False, row_group_size=ROW_GROUP_ROWS)
+    os.replace(tmp, target)
+
+
+def _write_json(data, target):
+    tmp = target.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, target)
+
+
+def _write_bytes(data, target):
+    tmp = target.with_suffix('.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, target)
@@ -0,0 +1,107 @@
+import io
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+# Chart output. Charts are drawn on pooled Agg figures (one per figure size, cleared
+# between charts instead of being created and closed through pyplot) and encoded
+# straight to bytes, which are kept as bytes all the way to the download views and email.
+# - png: the RGB image reduced to an adaptive palette of png_colors colours, which
+#   suits flat chart graphics (0 keeps full colour). Max-coverage quantization keeps
+#   colour-bar gradients smooth where the faster octree method shows banding,
+# - webp: lossless WebP,
+# - svg: vector output for simple charts; dense ones (scatter plots, hexbins,
+#   large heatmaps) would make large SVGs and are rendered as PNG instead.
+
+FORMATS = {'png': 'image/png', 'webp': 'image/webp', 'svg': 'image/svg+xml'}
+DEFAULT_DPI = 100
+DEFAULT_PNG_COLORS = 256
+SVG_MAX_ELEMENTS = 300
+MAX_POOLED_FIGURES = 4
+
+
+class ChartRenderer:
+    """Renders figures to PNG, WebP or SVG bytes, reusing a figure and Agg canvas per size."""
+
+    def __init__(self, fmt='png', dpi=DEFAULT_DPI, png_colors=DEFAULT_PNG_COLORS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown chart format: {fmt}. Choose from {', '.join(FORMATS)}.")
+        self.fmt = fmt
+        self.dpi = dpi
+        self.png_colors = png_colors
+        self._figures = OrderedDict()
+
+    @contextmanager
+    def figure(self, figsize):
+        """
+        A blank figure of the given size (inches), taken from the pool and cleared
+        and returned to it afterwards. A figure is only used by one caller at a time.
+        """
+        key = (round(float(figsize[0]), 2), round(float(figsize[1]), 2))
+        fig = self._figures.pop(key, None)
+        if fig is None:
+            fig = Figure(figsize=key, dpi=self.dpi, layout='tight')
+            FigureCanvasAgg(fig)
+        try:
+            yield fig
+        finally:
+            fig.clear()
+            self._figures[key] = fig
+            while len(self._figures) > MAX_POOLED_FIGURES:
+                self._figures.popitem(last=False)
+
+    def render(self, fig, title):
+        """Encodes the figure and returns the chart: {'title', 'image' (bytes), 'format', 'content_type'}."""
+        fmt = self.fmt
+        if fmt == 'svg' and count_elements(fig) > SVG_MAX_ELEMENTS:
+            fmt = 'png'
+
+        buf = io.BytesIO()
+        if fmt == 'svg':
+            # Text as <text> elements rather than glyph outlines; no timestamp, so equal charts give equal bytes
+            with matplotlib.rc_context({'svg.fonttype': 'none'}):
+                fig.savefig(buf, format='svg', metadata={'Date': None})
+        else:
+            fig.canvas.draw()
+            image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert('RGB')
+            if fmt == 'webp':
+                image.save(buf, format='WEBP', lossless=True, method=4)
+            else:
+                if self.png_colors:
+                    image = image.quantize(self.png_colors, method=Image.Quantize.MAXCOVERAGE)
+                image.save(buf, format='PNG', compress_level=6)
+        return {'title': title, 'image': buf.getvalue(), 'format': fmt, 'content_type': FORMATS[fmt]}
+
+
+def count_elements(fig):
+    """Rough number of primitives the figure draws (raster images count as too many for SVG)."""
+    count = 0
+    for ax in fig.axes:
+        count += len(ax.patches) + len(ax.lines) + len(ax.texts) + SVG_MAX_ELEMENTS * len(ax.images)
+        for collection in ax.collections:
+            count += max(len(collection.get_offsets()), len(collection.get_paths()))
+    return count
+
+
+_RENDERERS = {}
+
+
+def get_renderer(fmt=None, dpi=None):
+    """
+    Returns the shared renderer for a format and DPI, so its figures are reused across analyses.
+    Defaults to the CHART_FORMAT and CHART_DPI environment variables, else PNG at 100 DPI;
+    CHART_PNG_COLORS sets the PNG palette size.
+    """
+    fmt = (fmt or os.environ.get('CHART_FORMAT', 'png')).lower()
+    dpi = int(dpi or os.environ.get('CHART_DPI', DEFAULT_DPI))
+    png_colors = int(os.environ.get('CHART_PNG_COLORS', DEFAULT_PNG_COLORS))
+    key = (fmt, dpi, png_colors)
+    if key not in _RENDERERS:
+        _RENDERERS[key] = ChartRenderer(fmt, dpi, png_colors)
+    return _RENDERERS[key]
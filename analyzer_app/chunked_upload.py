@@ -0,0 +1,478 @@
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+from chardet import UniversalDetector
+
+from .admission import (
+    MODE_DOWNSAMPLE, MODE_FULL, SNIFF_BYTES, AdmissionRejected, detect_file_encoding, estimate_upload,
+    normalize_encoding,
+)
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+META_FILE = 'meta.json'
+OWNER_FILE = 'owner'
+ASSEMBLED_FILE = 'upload.bin'
+# An upload's parser (and its memory reservation) is dropped after this long without a new chunk
+PARSER_IDLE_SECONDS = 120
+
+
+class ChunkedUploadError(ValueError):
+    """Raised for invalid chunk requests (unknown upload, bad index, checksum mismatch, missing chunks)."""
+
+
+class ChunkedUploadStore:
+    """
+    Keeps the chunks of resumable uploads on disk, one file per chunk.
+    The received chunks are derived from the directory listing, so any worker
+    process can accept any chunk and report the upload's progress.
+    parser_idle_seconds is how long the owning process keeps the parser of an
+    upload that receives no chunks (see purge_idle_parsers).
+    """
+
+    def __init__(self, root, parser_idle_seconds=PARSER_IDLE_SECONDS):
+        self.root = Path(root)
+        self.parser_idle_seconds = parser_idle_seconds
+
+    def _path(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(str(upload_id)):
+            raise ChunkedUploadError(f"Invalid upload id: {upload_id!r}")
+        return self.root / upload_id
+
+    def _chunk_path(self, upload_id, index):
+        return self._path(upload_id) / f"chunk_{index:06d}"
+
+    def start(self, filename, file_type, total_size, chunk_size, estimate=None):
+        """Creates the upload; estimate is its admission estimate, if it was planned up front."""
+        upload_id = uuid.uuid4().hex
+        path = self._path(upload_id)
+        path.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'file_type': file_type,
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': max(1, -(-total_size // chunk_size)),
+            'estimate': estimate,
+        }
+        with open(path / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        logging.info(f"Started chunked upload {upload_id} for '{filename}' ({total_size} bytes in {meta['total_chunks']} chunks).")
+        return meta
+
+    def meta(self, upload_id):
+        try:
+            with open(self._path(upload_id) / META_FILE, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ChunkedUploadError(f"Unknown upload: {upload_id}")
+
+    def claim(self, upload_id):
+        """
+        Makes the calling process the upload's parsing owner unless another one
+        already is. Returns whether this process owns the upload.
+        """
+        try:
+            fd = os.open(self._path(upload_id) / OWNER_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return self.owner(upload_id) == os.getpid()
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def owner(self, upload_id):
+        """PID of the process parsing the upload incrementally, if any."""
+        try:
+            return int((self._path(upload_id) / OWNER_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def disown(self, upload_id):
+        """Withdraws the parsing owner, whose process then drops its parser (see purge_idle_parsers)."""
+        (self._path(upload_id) / OWNER_FILE).unlink(missing_ok=True)
+
+    def exists(self, upload_id):
+        return (self._path(upload_id) / META_FILE).exists()
+
+    def idle_seconds(self, upload_id):
+        """Seconds since the last chunk of the upload was stored by any worker (its directory's mtime)."""
+        try:
+            return time.time() - self._path(upload_id).stat().st_mtime
+        except FileNotFoundError:
+            return float('inf')
+
+    def received(self, upload_id):
+        path = self._path(upload_id)
+        return sorted(int(entry.name[6:]) for entry in path.iterdir() if entry.name.startswith('chunk_'))
+
+    def has_chunk(self, upload_id, index):
+        return self._chunk_path(upload_id, index).exists()
+
+    def read_chunk(self, upload_id, index):
+        return self._chunk_path(upload_id, index).read_bytes()
+
+    def save_chunk(self, upload_id, index, data, checksum):
+        """Verifies the chunk's SHA-256 and stores it. Re-sending a chunk overwrites it."""
+        meta = self.meta(upload_id)
+        if not 0 <= index < meta['total_chunks']:
+            raise ChunkedUploadError(f"Chunk index {index} out of range (0-{meta['total_chunks'] - 1}).")
+        expected_size = min(meta['chunk_size'], meta['total_size'] - index * meta['chunk_size'])
+        if len(data) != expected_size:
+            raise ChunkedUploadError(f"Chunk {index} has {len(data)} bytes, expected {expected_size}.")
+        if not checksum or hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise ChunkedUploadError(f"Checksum mismatch for chunk {index}.")
+
+        target = self._chunk_path(upload_id, index)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    def missing(self, upload_id):
+        meta = self.meta(upload_id)
+        received = set(self.received(upload_id))
+        return [i for i in range(meta['total_chunks']) if i not in received]
+
+    def assemble(self, upload_id):
+        """Concatenates the chunks into a single file and returns its path."""
+        meta = self.meta(upload_id)
+        target = self._path(upload_id) / ASSEMBLED_FILE
+        with open(target, 'wb') as out:
+            for index in range(meta['total_chunks']):
+                with open(self._chunk_path(upload_id, index), 'rb') as chunk:
+                    shutil.copyfileobj(chunk, out)
+        return target
+
+    def discard(self, upload_id):
+        shutil.rmtree(self._path(upload_id), ignore_errors=True)
+
+    def purge_expired(self, max_age_seconds):
+        if not self.root.exists():
+            return
+        cutoff = time.time() - max_age_seconds
+        for entry in self.root.iterdir():
+            if entry.is_dir() and UPLOAD_ID_PATTERN.match(entry.name) and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+
+
+class IncrementalCSVParser:
+    """
+    Parses CSV bytes as they arrive:
+    - detects the encoding and sniffs the delimiter from the first chunk,
+    - parses every run of complete records into a DataFrame batch,
+    - concatenates the batches in finish().
+    If incremental parsing is not possible (multi-byte line endings, parse
+    errors, batches inferring incompatible dtypes, batches taking more than
+    max_bytes of memory), finish() returns None and the caller parses the
+    assembled file in one go.
+    """
+    SNIFF_BYTES = 65536
+    MAX_BOUNDARY_PROBES = 64
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.parsed_bytes = 0
+        self.encoding = None
+        self.delimiter = None
+        self.next_index = 0
+        self.fallback_reason = None
+        self.last_activity = time.monotonic()
+        self._columns = None
+        self._pending = b''
+        self._frames = []
+
+    def feed(self, data):
+        self.next_index += 1
+        self.last_activity = time.monotonic()
+        if self.fallback_reason:
+            return
+        if self.encoding is None:
+            self._detect_format(data)
+            if self.fallback_reason:
+                return
+
+        buf = self._pending + data
+        boundary = self._record_boundary(buf)
+        self._pending = buf[boundary:]
+        if boundary:
+            self._parse(buf[:boundary])
+
+    def finish(self):
+        """Returns the parsed DataFrame, or None if the caller must parse the whole file."""
+        if not self.fallback_reason and self._pending.strip():
+            self._parse(self._pending)
+        self._pending = b''
+        if self.fallback_reason:
+            logging.info(f"Incremental CSV parsing not used: {self.fallback_reason}.")
+            return None
+        if not self._frames:
+            return pd.DataFrame()
+
+        for col in self._columns:
+            dtypes = {frame[col].dtype for frame in self._frames}
+            if len(dtypes) > 1 and not all(pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in dtypes):
+                logging.info(f"Incremental CSV parsing not used: column '{col}' inferred as {sorted(map(str, dtypes))} in different batches.")
+                return None
+        df = pd.concat(self._frames, ignore_index=True)
+        self._frames = []
+        return df
+
+    def _detect_format(self, data):
+        detector = UniversalDetector()
+        for start in range(0, len(data), self.SNIFF_BYTES):
+            detector.feed(data[start:start + self.SNIFF_BYTES])
+            if detector.done:
+                break
+        detector.close()
+        self.encoding = normalize_encoding(detector.result['encoding'])
+
+        # Try to detect delimiter
+        try:
+            sample = data[:self.SNIFF_BYTES].decode(self.encoding, errors='ignore').splitlines(True)[:5]
+            self.delimiter = csv.Sniffer().sniff(''.join(sample)).delimiter
+        except csv.Error:
+            self.delimiter = ',' # Default to comma if sniffing fails
+
+        if self.encoding.upper().startswith(('UTF-16', 'UTF-32')):
+            self.fallback_reason = f"{self.encoding} cannot be split on byte-level line breaks"
+
+    def _record_boundary(self, buf):
+        """Offset just past the last line break that is not inside a quoted field."""
+        end = buf.rfind(b'\n')
+        for _ in range(self.MAX_BOUNDARY_PROBES):
+            if end == -1:
+                break
+            if buf.count(b'"', 0, end) % 2 == 0:
+                return end + 1
+            end = buf.rfind(b'\n', 0, end)
+        return 0
+
+    def _parse(self, records):
+        try:
+            if self._columns is None:
+                frame = pd.read_csv(io.BytesIO(records), sep=self.delimiter, encoding=self.encoding)
+                self._columns = list(frame.columns)
+            else:
+                frame = pd.read_csv(io.BytesIO(records), sep=self.delimiter, encoding=self.encoding,
+                                    header=None, names=self._columns)
+        except Exception as e:
+            self.fallback_reason = f"batch parse failed ({e})"
+            self._frames = []
+            return
+        self._frames.append(frame)
+        self.parsed_bytes += frame.memory_usage(deep=True, index=False).sum()
+        if self.max_bytes is not None and self.parsed_bytes > self.max_bytes:
+            self.fallback_reason = f"parsed data exceeded the {self.max_bytes / 2**20:,.1f} MiB reserved for it"
+            self._frames = []
+
+    @property
+    def over_budget(self):
+        return self.max_bytes is not None and self.parsed_bytes > self.max_bytes
+
+
+# Only the worker process that received chunk 0 (the upload's owner) parses it
+# incrementally, so there is at most one parsed copy of an upload. It does so only
+# if the upload's admission plan is a full or downsample analysis and that memory
+# can be reserved right away; the parser holds the reservation, its batches are
+# counted against it, and the completing request takes it over. If the completing
+# request lands on another worker, that worker disowns the upload and parses the
+# assembled file under its own reservation instead.
+# Each process's janitor thread drops parsers (and releases their reservations)
+# whose upload was completed, discarded or disowned elsewhere (its meta.json or
+# owner file is gone) or that have been idle too long.
+_parsers = {}
+_reservations = {}
+_parsers_lock = threading.Lock()
+_upload_locks = {}
+_janitor = None
+
+JANITOR_INTERVAL_SECONDS = 10
+
+
+def _upload_lock(upload_id):
+    with _parsers_lock:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def upload_estimate(store, upload_id):
+    """The upload's admission estimate: the one planned when it started, else sniffed from chunk 0."""
+    meta = store.meta(upload_id)
+    if meta.get('estimate'):
+        return meta['estimate']
+    return estimate_upload(meta['file_type'], meta['total_size'], store.read_chunk(upload_id, 0)[:SNIFF_BYTES])
+
+
+def chunk_received(store, upload_id, index, controller):
+    """
+    Called after a chunk was stored: the receiver of chunk 0 becomes the owner and,
+    if the admission controller admits the upload for a full or downsample analysis
+    without queueing, parses what has arrived.
+    """
+    if index == 0 and store.claim(upload_id):
+        _start_parser(store, upload_id, controller)
+    return feed_received_chunks(store, upload_id)
+
+
+def _start_parser(store, upload_id, controller):
+    if store.meta(upload_id)['file_type'] != 'csv':
+        return
+    with _upload_lock(upload_id):
+        if upload_id in _parsers:
+            return
+        estimate = upload_estimate(store, upload_id)
+        try:
+            mode, _, _ = controller.plan(estimate)
+        except AdmissionRejected:
+            return # rejected when the upload completes
+        if mode not in (MODE_FULL, MODE_DOWNSAMPLE):
+            logging.info(f"Upload {upload_id} is planned for {mode} mode; it is parsed when it completes.")
+            return
+        reservation = controller.admit(estimate, wait=False)
+        if reservation is None:
+            logging.info(f"No memory free to parse upload {upload_id} incrementally; it is parsed when it completes.")
+            return
+        with _parsers_lock:
+            _parsers[upload_id] = IncrementalCSVParser(max_bytes=reservation.frame_allowance())
+            _reservations[upload_id] = reservation
+
+
+def feed_received_chunks(store, upload_id, wait=False):
+    """
+    Feeds the contiguous run of received chunks into the upload's CSV parser,
+    if this process owns the upload (else returns None).
+    Without wait, returns immediately if another thread is already feeding
+    (that thread picks up the newly stored chunk).
+    """
+    meta = store.meta(upload_id)
+    with _parsers_lock:
+        parser = _parsers.get(upload_id)
+    if parser is None or store.owner(upload_id) != os.getpid():
+        return None
+    lock = _upload_lock(upload_id)
+    if not lock.acquire(blocking=wait):
+        return None
+    try:
+        _start_janitor(store)
+        while parser.next_index < meta['total_chunks'] and store.has_chunk(upload_id, parser.next_index):
+            parser.feed(store.read_chunk(upload_id, parser.next_index))
+        if parser.over_budget:
+            # The estimate was too low for this data: the reservation no longer covers it
+            with _parsers_lock:
+                reservation = _reservations.pop(upload_id, None)
+            if reservation:
+                reservation.release()
+        return parser
+    finally:
+        lock.release()
+
+
+def take_reservation(store, upload_id):
+    """
+    Hands the completing request the memory reservation this process's parser holds
+    for the upload, if any. Otherwise an owner in another process is asked to drop
+    its parser and reservation, and the caller admits the upload itself.
+    """
+    with _parsers_lock:
+        reservation = _reservations.pop(upload_id, None)
+    if reservation is None and store.owner(upload_id) not in (None, os.getpid()):
+        store.disown(upload_id)
+    return reservation
+
+
+def finish_upload(store, upload_id):
+    """Returns the uploaded data as a DataFrame once every chunk has arrived."""
+    meta = store.meta(upload_id)
+    missing = store.missing(upload_id)
+    if missing:
+        raise ChunkedUploadError(f"Upload incomplete: {len(missing)} chunk(s) missing.")
+
+    try:
+        if meta['file_type'] == 'excel':
+            return pd.read_excel(store.assemble(upload_id))
+
+        parser = feed_received_chunks(store, upload_id, wait=True)
+        df = parser.finish() if parser else None
+        if df is None:
+            if parser is None or parser.encoding is None:
+                parser = IncrementalCSVParser()
+                parser._detect_format(store.read_chunk(upload_id, 0))
+            path = store.assemble(upload_id)
+            try:
+                df = pd.read_csv(path, sep=parser.delimiter or ',', encoding=parser.encoding or 'utf-8')
+            except UnicodeDecodeError as e:
+                encoding = detect_file_encoding(path)
+                logging.info(f"Upload {upload_id} is not {parser.encoding} throughout ({e}); re-reading it as {encoding}.")
+                df = pd.read_csv(path, sep=parser.delimiter or ',', encoding=encoding)
+        return df
+    finally:
+        discard_upload(store, upload_id)
+
+
+def discard_upload(store, upload_id):
+    _drop_parser(upload_id)
+    store.discard(upload_id)
+
+
+def _drop_parser(upload_id):
+    with _parsers_lock:
+        _parsers.pop(upload_id, None)
+        _upload_locks.pop(upload_id, None)
+        reservation = _reservations.pop(upload_id, None)
+    if reservation:
+        reservation.release()
+
+
+def purge_idle_parsers(store):
+    """
+    Drops parsers (and their reservations) of uploads that are gone (completed or
+    discarded by any worker), owned by another process now, or idle: no chunk
+    arrived in any worker for store.parser_idle_seconds, e.g. an abandoned upload.
+    A resumed upload is parsed from disk when it completes.
+    """
+    cutoff = time.monotonic() - store.parser_idle_seconds
+    pid = os.getpid()
+    with _parsers_lock:
+        candidates = list(_parsers.items())
+    stale = [key for key, parser in candidates
+             if not store.exists(key) or store.owner(key) != pid
+             or (parser.last_activity < cutoff and store.idle_seconds(key) > store.parser_idle_seconds)]
+    for upload_id in stale:
+        _drop_parser(upload_id)
+    if stale:
+        logging.info(f"Dropped {len(stale)} incremental CSV parser(s) of finished or idle uploads.")
+
+
+def _start_janitor(store):
+    global _janitor
+    with _parsers_lock:
+        if _janitor is not None:
+            return
+        _janitor = threading.Thread(target=_run_janitor, args=(store,), name='chunked-upload-janitor', daemon=True)
+        _janitor.start()
+
+
+def _run_janitor(store):
+    global _janitor
+    while True:
+        time.sleep(JANITOR_INTERVAL_SECONDS)
+        purge_idle_parsers(store)
+        with _parsers_lock:
+            if not _parsers:
+                _janitor = None
+                return
+
+
+def default_store():
+    from django.conf import settings
+    return ChunkedUploadStore(settings.CHUNKED_UPLOAD_ROOT, settings.CHUNKED_UPLOAD_PARSER_IDLE_SECONDS)
@@ -0,0 +1,60 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# Below this many columns the pool overhead outweighs any gain
+MIN_PARALLEL_COLUMNS = 16
+
+
+def default_workers():
+    """Worker count from ANALYZER_COLUMN_WORKERS, otherwise the CPU count (capped at 8)."""
+    configured = os.environ.get('ANALYZER_COLUMN_WORKERS')
+    if configured:
+        return max(1, int(configured))
+    return min(8, os.cpu_count() or 1)
+
+
+def _run_task(func, items):
+    return [func(series) for series in items]
+
+
+def map_columns(df, func, columns=None, max_workers=None):
+    """
+    Applies func to each selected column and returns a new DataFrame.
+    - func takes a Series and returns a Series (same length and index) or None to drop the column.
+    - Columns not in `columns` are passed through untouched.
+    - Columns are grouped into tasks and run on a thread pool; pandas/NumPy
+      kernels release the GIL for most numeric work.
+    - The result is assembled in one step instead of through repeated column assignment.
+    """
+    max_workers = max_workers or default_workers()
+    selected = set(columns) if columns is not None else None
+    positions = [i for i, col in enumerate(df.columns) if selected is None or col in selected]
+    items = [df.iloc[:, i] for i in positions]
+
+    if max_workers <= 1 or len(items) < MIN_PARALLEL_COLUMNS:
+        results = _run_task(func, items)
+    else:
+        # A few tasks per worker keeps the pool busy when column costs are uneven
+        n_tasks = min(len(items), max_workers * 4)
+        bounds = [len(items) * k // n_tasks for k in range(n_tasks + 1)]
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='column-worker') as pool:
+            futures = [pool.submit(_run_task, func, items[start:end]) for start, end in zip(bounds, bounds[1:])]
+            results = [result for future in futures for result in future.result()]
+        logging.debug(f"Processed {len(items)} columns in {n_tasks} tasks on {max_workers} threads.")
+
+    replaced = dict(zip(positions, results))
+    output = []
+    for i, col in enumerate(df.columns):
+        series = replaced[i] if i in replaced else df.iloc[:, i]
+        if series is None:
+            continue
+        if series.name != col:
+            series = series.rename(col)
+        output.append(series)
+
+    if not output:
+        return df.iloc[:, []]
+    return pd.concat(output, axis=1)
@@ -0,0 +1,86 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 100_000
+
+
+class CorrelationAccumulator:
+    """
+    Accumulates pairwise-complete Pearson statistics over row chunks.
+    Each update is four matrix products over the chunk (BLAS), so the whole
+    matrix costs O(rows * columns^2) flops and O(columns^2) memory, however
+    many rows are streamed through:
+    - n[i, j]: rows where both columns are present,
+    - sx[i, j]: sum of column i over those rows (sxx likewise for its squares),
+    - sxy[i, j]: sum of the products.
+    Values are shifted by the first chunk's column means to keep the sums well
+    conditioned; correlation is shift-invariant.
+    """
+
+    def __init__(self, n_columns):
+        self.n_columns = n_columns
+        self.shift = None
+        shape = (n_columns, n_columns)
+        self.n = np.zeros(shape)
+        self.sx = np.zeros(shape)
+        self.sxx = np.zeros(shape)
+        self.sxy = np.zeros(shape)
+
+    def update(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if self.shift is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning) # all-NaN columns
+                self.shift = np.nan_to_num(np.nanmean(block, axis=0)) if len(block) else np.zeros(self.n_columns)
+        valid = ~np.isnan(block)
+        mask = valid.astype(np.float64)
+        values = np.where(valid, block - self.shift, 0.0)
+        self.n += mask.T @ mask
+        self.sx += values.T @ mask
+        self.sxx += (values * values).T @ mask
+        self.sxy += values.T @ values
+
+    def result(self):
+        """The correlation matrix; NaN where a pair has fewer than two rows or no variance."""
+        with np.errstate(all='ignore'):
+            cov = self.n * self.sxy - self.sx * self.sx.T
+            var_i = self.n * self.sxx - self.sx * self.sx
+            var_j = var_i.T
+            corr = cov / np.sqrt(var_i * var_j)
+        corr[(self.n < 2) | (var_i <= 0) | (var_j <= 0)] = np.nan
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, np.where((np.diag(self.n) >= 2) & (np.diag(var_i) > 0), 1.0, np.nan))
+        return corr
+
+
+def correlation_matrix(df, method='pearson', columns=None, chunk_rows=CHUNK_ROWS):
+    """
+    Pearson or Spearman correlation of the numeric columns, pairwise-complete.
+    Spearman is Pearson on the average ranks of each column (ranked over the
+    column's own non-missing values; identical to pandas when there are no gaps).
+    Rows are fed to the accumulator chunk_rows at a time.
+    """
+    if method not in ('pearson', 'spearman'):
+        raise ValueError(f"Unknown correlation method: {method}")
+    if columns is None:
+        columns = df.select_dtypes(include=np.number).columns
+    data = df[columns]
+    if method == 'spearman':
+        data = data.rank(method='average')
+
+    accumulator = CorrelationAccumulator(len(columns))
+    for start in range(0, len(data), chunk_rows):
+        accumulator.update(data.iloc[start:start + chunk_rows].to_numpy(dtype=np.float64, na_value=np.nan))
+    return pd.DataFrame(accumulator.result(), index=columns, columns=columns)
+
+
+def top_pairs(corr, n=3, min_abs=0.0):
+    """The n column pairs with the largest absolute correlation, as (column, column, r)."""
+    values = corr.to_numpy()
+    rows, cols = np.triu_indices(len(values), k=1)
+    strengths = np.abs(values[rows, cols])
+    order = [i for i in np.argsort(-np.nan_to_num(strengths, nan=-1.0), kind='stable')
+             if not np.isnan(strengths[i]) and strengths[i] >= min_abs]
+    return [(corr.index[rows[i]], corr.columns[cols[i]], float(values[rows[i], cols[i]])) for i in order[:n]]
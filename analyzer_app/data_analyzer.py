@@ -5,17 +5,89 @@ import seaborn as sns
 import warnings
 import os
 import io
-import base64
 import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from .engines import get_engine
+from .charts import get_renderer
+from .correlation import correlation_matrix, top_pairs
+from . import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-from sklearn.preprocessing import LabelEncoder
-from sklearn.impute import SimpleImputer
 
 warnings.filterwarnings('ignore')
 
+# Copy-on-Write lets the original and processed frames share every column the
+# pipeline does not change (always on from pandas 3)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Relationship plots: how many of the most correlated pairs get a detail plot, and
+# above how many rows the detail plot bins the points instead of scattering them
+MAX_DETAIL_PAIRS = 3
+SCATTER_MAX_ROWS = 5000
+
+# pyplot keeps global figure state, so concurrent analyses (e.g. a background
+# full-data run next to a request's sample run) must not plot at the same time.
+_PLOT_LOCK = threading.Lock()
+
+
+def sample_rows(df, n, stratify_by=None, random_state=0):
+    """
+    Returns a random sample of at most n rows.
+    - Without stratify_by every row has the same chance of being picked.
+    - With stratify_by each group keeps its share of the rows (at least one row per group).
+    """
+    if len(df) <= n:
+        return df
+    rng = np.random.default_rng(random_state)
+    if stratify_by is None:
+        positions = np.sort(rng.choice(len(df), size=n, replace=False))
+        return df.iloc[positions]
+
+    # Shuffle once, then keep the first `quota` rows of every group
+    shuffled = df.iloc[rng.permutation(len(df))]
+    groups = shuffled[stratify_by].astype(object).where(shuffled[stratify_by].notna(), '__missing__')
+    shares = groups.value_counts(normalize=True)
+    quotas = (shares * n).round().clip(lower=1).astype(int)
+    keep = groups.groupby(groups).cumcount().to_numpy() < groups.map(quotas).to_numpy()
+    return shuffled[keep].sort_index()
+
+
+def _json_value(value):
+    """A JSON-serialisable version of a summary statistic (NaN becomes None)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, pd.Timedelta)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return _json_value(value.item())
+    return value
+
+
+def sample_margin_of_error(n, total, z=1.96):
+    """Worst-case margin of error of a proportion estimated from n of total rows (finite population corrected)."""
+    if n >= total or total < 2:
+        return 0.0
+    return z * np.sqrt(0.25 / n) * np.sqrt((total - n) / (total - 1))
+
+
 class DataAnalyzer:
-    def __init__(self, file_path=None, df=None):
+    def __init__(self, file_path=None, df=None, n_jobs=None, track_memory=False, engine=None,
+                 chart_format=None, chart_dpi=None):
+        # Threads used for the per-column cleaning stages (None: ANALYZER_COLUMN_WORKERS or CPU count)
+        self.n_jobs = n_jobs
+        # DataFrame engine running the stages ('pandas', 'polars', 'auto'; None: ANALYZER_ENGINE)
+        self.engine = get_engine(engine, n_jobs=n_jobs)
+        # Chart output ('png', 'webp', 'svg' and DPI; None: CHART_FORMAT / CHART_DPI)
+        self.charts = get_renderer(chart_format, chart_dpi)
+        # Record per-stage peak memory with tracemalloc in run_analysis (adds overhead)
+        self.track_memory = track_memory
+        self.stage_stats = {}
+        self.correlations = None
         if file_path:
             self.file_path = file_path
             self.df = self._load_data()
@@ -24,6 +96,23 @@ class DataAnalyzer:
         else:
             raise ValueError("Either file_path or df must be provided.")
 
+    @property
+    def df(self):
+        """The current data as a pandas DataFrame (materialized from the engine's frame on demand)."""
+        if self._df is None:
+            self._df = self.engine.to_pandas(self._frame, index=self._index)
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        self._df = value
+        self._index = value.index
+        self._frame = self.engine.from_pandas(value)
+
+    def _set_frame(self, frame):
+        self._frame = frame
+        self._df = None
+
     def _load_data(self):
         """Loads data from the specified file path, supporting CSV and Excel."""
         file_extension = os.path.splitext(self.file_path)[1].lower()
@@ -41,7 +130,10 @@ class DataAnalyzer:
             raise
 
     def summarize_data(self):
-        """Provides a comprehensive summary of the dataframe and returns it as a dictionary."""
+        """
+        Provides a comprehensive summary of the dataframe and returns it as a dictionary.
+        The 'statistics' entry holds the same figures as plain JSON values (for the results API).
+        """
         summaries = {}
 
         # Data Info
@@ -50,10 +142,20 @@ class DataAnalyzer:
         summaries['data_info'] = buf.getvalue()
 
         # Missing Values
-        summaries['missing_values'] = self.df.isnull().sum().to_frame('count').to_html()
+        missing = self.engine.missing_counts(self._frame)
+        summaries['missing_values'] = missing.to_frame('count').to_html()
 
         # Descriptive Statistics
-        summaries['descriptive_statistics'] = self.df.describe().to_html()
+        described = self.engine.describe(self._frame)
+        summaries['descriptive_statistics'] = described.to_html()
+
+        summaries['statistics'] = {
+            'rows': len(self.df),
+            'columns': [{'name': str(col), 'dtype': str(dtype), 'missing': int(missing.get(col, 0))}
+                        for col, dtype in self.df.dtypes.items()],
+            'describe': {str(col): {stat: _json_value(value) for stat, value in values.items()}
+                         for col, values in described.to_dict().items()},
+        }
 
         return summaries
 
@@ -68,44 +170,17 @@ class DataAnalyzer:
         logging.info("--- Handling Missing Values ---")
         
         # Convert common string placeholders to NaN
-        for col in self.df.columns:
-            if self.df[col].dtype == 'object':
-                initial_nan_count = self.df[col].isnull().sum()
-                self.df[col] = self.df[col].replace(['?', 'missing', 'Missing', 'NaN', 'nan', 'N/A', 'None', ''], np.nan)
-                if self.df[col].isnull().sum() > initial_nan_count:
-                    logging.info(f"Converted string placeholders to NaN in column '{col}'.")
+        frame = self.engine.replace_placeholders(self._frame)
 
         # Drop columns with too many missing values
-        initial_cols = self.df.shape[1]
-        cols_to_keep = []
-        for col in self.df.columns:
-            missing_percentage = self.df[col].isnull().sum() / len(self.df)
-            if missing_percentage <= drop_threshold:
-                cols_to_keep.append(col)
-            else:
-                logging.info(f"Column '{col}' dropped due to high missing value percentage ({missing_percentage*100:.2f}% missing).")
-        self.df = self.df[cols_to_keep]
-        if self.df.shape[1] < initial_cols:
-            dropped_cols_count = initial_cols - self.df.shape[1]
+        initial_cols = len(frame.columns)
+        frame = self.engine.drop_sparse_columns(frame, drop_threshold)
+        if len(frame.columns) < initial_cols:
+            dropped_cols_count = initial_cols - len(frame.columns)
             logging.info(f"Dropped {dropped_cols_count} columns due to high missing value percentage (>{drop_threshold*100}% missing).")
         
         # Impute remaining missing values
-        for col in self.df.columns:
-            if self.df[col].isnull().any():
-                if pd.api.types.is_numeric_dtype(self.df[col]):
-                    if not self.df[col].isnull().all(): # Only impute if not all values are NaN
-                        self.df[col] = self.df[col].fillna(self.df[col].mean())
-                        logging.info(f"Imputed missing values in numerical column '{col}' with mean.")
-                    else:
-                        logging.warning(f"Column '{col}' is entirely NaN and cannot be imputed with mean. Consider dropping or alternative handling.")
-                else:
-                    # Use SimpleImputer for categorical mode imputation to handle potential empty series from mode()
-                    if not self.df[col].isnull().all(): # Only impute if not all values are NaN
-                        imputer = SimpleImputer(strategy='most_frequent')
-                        self.df[col] = imputer.fit_transform(self.df[[col]]).ravel()
-                        logging.info(f"Imputed missing values in categorical column '{col}' with mode.")
-                    else:
-                        logging.warning(f"Column '{col}' is entirely NaN and cannot be imputed with mode. Consider dropping or alternative handling.")
+        self._set_frame(self.engine.impute_missing(frame))
         logging.info("Missing values handled.")
 
     def convert_datatypes(self):
@@ -116,37 +191,7 @@ class DataAnalyzer:
         - Converts float columns to int if all values are integers.
         """
         logging.info("--- Converting Data Types ---")
-        for col in self.df.columns:
-            # Try to convert to datetime first
-            if self.df[col].dtype == 'object':
-                try:
-                    converted_datetime = pd.to_datetime(self.df[col], errors='coerce')
-                    if not converted_datetime.isnull().all():
-                        self.df[col] = converted_datetime
-                        logging.info(f"Converted column '{col}' to datetime.")
-                        continue # Skip to next column if successfully converted to datetime
-                except Exception as e:
-                    logging.debug(f"Could not convert column '{col}' to datetime: {e}")
-
-            # Try to clean and convert to numeric
-            if self.df[col].dtype == 'object':
-                # Remove common non-numeric characters
-                cleaned_col = self.df[col].astype(str).str.replace(r'[$,+%]', '', regex=True).str.strip()
-                
-                # Attempt to convert to numeric
-                converted_numeric = pd.to_numeric(cleaned_col, errors='coerce')
-                
-                # If a significant portion could be converted and it's not all NaNs, update the column
-                if pd.api.types.is_numeric_dtype(converted_numeric) and converted_numeric.notna().sum() > 0.5 * len(self.df) and not converted_numeric.isnull().all():
-                    self.df[col] = converted_numeric
-                    logging.info(f"Converted column '{col}' to numeric.")
-                elif converted_numeric.isnull().all():
-                    logging.warning(f"Column '{col}' became entirely NaN after numeric conversion attempt. Keeping as object.")
-
-            # Convert float to int if all values are integers and not all are NaN
-            if pd.api.types.is_float_dtype(self.df[col]) and not self.df[col].isnull().all() and (self.df[col].dropna() == self.df[col].dropna().astype(int)).all():
-                self.df[col] = self.df[col].astype(int)
-                logging.info(f"Converted float column '{col}' to integer.")
+        self._set_frame(self.engine.convert_datatypes(self._frame))
         logging.info("Data types converted.")
 
     def handle_outliers(self, lower_percentile=0.05, upper_percentile=0.95):
@@ -154,17 +199,7 @@ class DataAnalyzer:
         Handles outliers by capping/flooring numerical columns.
         """
         print("\n--- Handling Outliers ---")
-        for col in self.df.select_dtypes(include=np.number).columns:
-            Q1 = self.df[col].quantile(0.25)
-            Q3 = self.df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-
-            # Cap/Floor outliers
-            self.df[col] = np.where(self.df[col] < lower_bound, self.df[col].quantile(lower_percentile), self.df[col])
-            self.df[col] = np.where(self.df[col] > upper_bound, self.df[col].quantile(upper_percentile), self.df[col])
-            print(f"Capped/floored outliers in numerical column '{col}'.")
+        self._set_frame(self.engine.cap_outliers(self._frame, lower_percentile, upper_percentile))
         print("Outliers handled.")
 
     def encode_categoricals(self):
@@ -173,22 +208,40 @@ class DataAnalyzer:
         Excludes columns that are likely unique identifiers (e.g., 'Name', 'ID', 'Product_ID').
         """
         print("\n--- Encoding Categorical Features ---")
-        for col in self.df.select_dtypes(include='object').columns:
-            # Heuristic to avoid encoding unique identifiers
-            if self.df[col].nunique() > 0.8 * len(self.df) or 'name' in col.lower() or 'id' in col.lower():
-                print(f"Skipping encoding for '{col}' (likely a unique identifier).")
-                continue
-            
-            le = LabelEncoder()
-            self.df[col] = le.fit_transform(self.df[col])
-            print(f"Label encoded column '{col}'.")
+        self._set_frame(self.engine.encode_categoricals(self._frame))
         print("Categorical features encoded.")
 
+    def analyze_correlations(self, max_pairs=MAX_DETAIL_PAIRS):
+        """
+        Computes the Pearson and Spearman correlation matrices of all numerical columns
+        and picks the most strongly related pairs (by the larger of the two coefficients).
+        Returns the top pairs as an HTML table, or None with fewer than two numerical columns.
+        """
+        logging.info("--- Analyzing Correlations ---")
+        numerical_cols = self.df.select_dtypes(include=np.number).columns
+        if len(numerical_cols) < 2:
+            self.correlations = None
+            return None
+
+        pearson = correlation_matrix(self.df, 'pearson', columns=numerical_cols)
+        spearman = correlation_matrix(self.df, 'spearman', columns=numerical_cols)
+        strength = np.fmax(pearson.abs(), spearman.abs())
+        pairs = [(a, b, pearson.loc[a, b], spearman.loc[a, b]) for a, b, _ in top_pairs(strength, n=max_pairs)]
+        self.correlations = {'pearson': pearson, 'spearman': spearman, 'top_pairs': pairs}
+        logging.info(f"Computed correlations for {len(numerical_cols)} numerical columns.")
+        return pd.DataFrame(pairs, columns=['column', 'other column', 'pearson', 'spearman']).round(3).to_html(index=False)
+
     def generate_visualizations(self):
         """
-        Generates various visualizations and returns them as base64 encoded strings.
-        Includes checks for sufficient data and improved aesthetics.
+        Generates various visualizations and returns them as encoded image bytes
+        (see charts.ChartRenderer for the formats). Includes checks for sufficient data and improved aesthetics.
         """
+        with _PLOT_LOCK:
+            plots = self._generate_visualizations()
+        metrics.CHARTS_RENDERED.inc(len(plots))
+        return plots
+
+    def _generate_visualizations(self):
         logging.info("--- Generating Visualizations ---")
         plots = []
 
@@ -198,7 +251,6 @@ class DataAnalyzer:
 
         # Set a consistent style for all plots
         sns.set_style("whitegrid")
-        plt.rcParams['figure.autolayout'] = True # Automatically adjust plot params for a tight layout
 
         # Numerical columns
         numerical_cols = self.df.select_dtypes(include=np.number).columns
@@ -209,36 +261,28 @@ class DataAnalyzer:
 
             # Histogram
             try:
-                plt.figure(figsize=(10, 6))
-                sns.histplot(data=self.df, x=col, kde=True)
-                plt.title(f'Distribution of {col.replace('_', ' ').title()}', fontsize=16)
-                plt.xlabel(col.replace('_', ' ').title(), fontsize=12)
-                plt.ylabel('Frequency', fontsize=12)
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                plots.append({'title': f'Distribution of {col.replace('_', ' ').title()}', 'image': base64.b64encode(buf.getvalue()).decode('utf-8')})
-                plt.close()
+                with self.charts.figure((10, 6)) as fig:
+                    ax = fig.subplots()
+                    sns.histplot(data=self.df, x=col, kde=True, ax=ax)
+                    ax.set_title(f'Distribution of {col.replace('_', ' ').title()}', fontsize=16)
+                    ax.set_xlabel(col.replace('_', ' ').title(), fontsize=12)
+                    ax.set_ylabel('Frequency', fontsize=12)
+                    plots.append(self.charts.render(fig, f'Distribution of {col.replace('_', ' ').title()}'))
                 logging.info(f"Generated histogram for {col}")
             except Exception as e:
                 logging.error(f"Error generating histogram for {col}: {e}")
-                plt.close()
 
             # Box plot
             try:
-                plt.figure(figsize=(10, 6))
-                sns.boxplot(data=self.df, y=col, orientation='vertical')
-                plt.title(f'Box Plot of {col.replace('_', ' ').title()}', fontsize=16)
-                plt.ylabel(col.replace('_', ' ').title(), fontsize=12)
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                plots.append({'title': f'Box Plot of {col.replace('_', ' ').title()}', 'image': base64.b64encode(buf.getvalue()).decode('utf-8')})
-                plt.close()
+                with self.charts.figure((10, 6)) as fig:
+                    ax = fig.subplots()
+                    sns.boxplot(data=self.df, y=col, orientation='vertical', ax=ax)
+                    ax.set_title(f'Box Plot of {col.replace('_', ' ').title()}', fontsize=16)
+                    ax.set_ylabel(col.replace('_', ' ').title(), fontsize=12)
+                    plots.append(self.charts.render(fig, f'Box Plot of {col.replace('_', ' ').title()}'))
                 logging.info(f"Generated box plot for {col}")
             except Exception as e:
                 logging.error(f"Error generating box plot for {col}: {e}")
-                plt.close()
 
         # Categorical columns
         categorical_cols = self.df.select_dtypes(include='object').columns
@@ -251,41 +295,24 @@ class DataAnalyzer:
                 continue
 
             try:
-                plt.figure(figsize=(12, 7))
-                sns.countplot(data=self.df, x=col, order=self.df[col].value_counts().index)
-                plt.title(f'Count of {col.replace('_', ' ').title()}', fontsize=16)
-                plt.xlabel(col.replace('_', ' ').title(), fontsize=12)
-                plt.ylabel('Count', fontsize=12)
-                plt.xticks(rotation=45, ha='right')
-                buf = io.BytesIO()
-                plt.savefig(buf, format='png')
-                buf.seek(0)
-                plots.append({'title': f'Count of {col.replace('_', ' ').title()}', 'image': base64.b64encode(buf.getvalue()).decode('utf-8')})
-                plt.close()
+                with self.charts.figure((12, 7)) as fig:
+                    ax = fig.subplots()
+                    sns.countplot(data=self.df, x=col, order=self.engine.value_counts(self._frame, col).index, ax=ax)
+                    ax.set_title(f'Count of {col.replace('_', ' ').title()}', fontsize=16)
+                    ax.set_xlabel(col.replace('_', ' ').title(), fontsize=12)
+                    ax.set_ylabel('Count', fontsize=12)
+                    ax.tick_params(axis='x', labelrotation=45)
+                    plt.setp(ax.get_xticklabels(), ha='right')
+                    plots.append(self.charts.render(fig, f'Count of {col.replace('_', ' ').title()}'))
                 logging.info(f"Generated count plot for {col}")
             except Exception as e:
                 logging.error(f"Error generating count plot for {col}: {e}")
-                plt.close()
 
-        # Pair plot for a subset of numerical columns
+        # Correlation heatmap and detail plots of the most correlated pairs
         if len(numerical_cols) > 1:
-            subset_cols = numerical_cols[:min(len(numerical_cols), 5)] # Limit to first 5 for pair plot
-            # Ensure there's enough valid data for a pair plot
-            plot_df = self.df[subset_cols].dropna()
-            if not plot_df.empty and len(subset_cols) > 1:
-                try:
-                    plt.figure(figsize=(12, 10))
-                    sns.pairplot(plot_df)
-                    plt.suptitle('Pair Plot of Numerical Features', y=1.02, fontsize=18)
-                    buf = io.BytesIO()
-                    plt.savefig(buf, format='png')
-                    buf.seek(0)
-                    plots.append({'title': 'Pair Plot of Numerical Features', 'image': base64.b64encode(buf.getvalue()).decode('utf-8')})
-                    plt.close()
-                    logging.info("Generated pair plot.")
-                except Exception as e:
-                    logging.error(f"Error generating pair plot: {e}")
-                    plt.close()
+            if self.correlations is None:
+                self.analyze_correlations()
+            plots.extend(self._correlation_plots())
 
         # Numerical vs Categorical Box plots (if suitable columns exist)
         if len(numerical_cols) > 0 and len(categorical_cols) > 0:
@@ -293,33 +320,156 @@ class DataAnalyzer:
             cat_col = categorical_cols[0] # Take the first categorical column
             if self.df[cat_col].nunique() < 20: # Only if not too many categories
                 try:
-                    plt.figure(figsize=(12, 7))
-                    sns.boxplot(data=self.df, x=cat_col, y=num_col)
-                    plt.title(f'{num_col.replace('_', ' ').title()} by {cat_col.replace('_', ' ').title()}', fontsize=16)
-                    plt.xlabel(cat_col.replace('_', ' ').title(), fontsize=12)
-                    plt.ylabel(num_col.replace('_', ' ').title(), fontsize=12)
-                    plt.xticks(rotation=45, ha='right')
-                    buf = io.BytesIO()
-                    plt.savefig(buf, format='png')
-                    buf.seek(0)
-                    plots.append({'title': f'{num_col.replace('_', ' ').title()} by {cat_col.replace('_', ' ').title()}', 'image': base64.b64encode(buf.getvalue()).decode('utf-8')})
-                    plt.close()
+                    with self.charts.figure((12, 7)) as fig:
+                        ax = fig.subplots()
+                        sns.boxplot(data=self.df, x=cat_col, y=num_col, ax=ax)
+                        ax.set_title(f'{num_col.replace('_', ' ').title()} by {cat_col.replace('_', ' ').title()}', fontsize=16)
+                        ax.set_xlabel(cat_col.replace('_', ' ').title(), fontsize=12)
+                        ax.set_ylabel(num_col.replace('_', ' ').title(), fontsize=12)
+                        ax.tick_params(axis='x', labelrotation=45)
+                        plt.setp(ax.get_xticklabels(), ha='right')
+                        plots.append(self.charts.render(fig, f'{num_col.replace('_', ' ').title()} by {cat_col.replace('_', ' ').title()}'))
                     logging.info(f"Generated numerical vs categorical box plot for {num_col} by {cat_col}")
                 except Exception as e:
                     logging.error(f"Error generating numerical vs categorical box plot for {num_col} by {cat_col}: {e}")
-                    plt.close()
         
         logging.info("Visualizations generation complete.")
         return plots
 
-    def run_analysis(self):
-        """Runs the full data cleaning and analysis pipeline."""
-        initial_summary = self.summarize_data()
-        self.handle_missing_values()
-        self.convert_datatypes()
-        self.handle_outliers()
-        self.encode_categoricals()
-        final_summary = self.summarize_data() # Summarize again after cleaning
-        plots = self.generate_visualizations()
+    def _correlation_plots(self):
+        plots = []
+        if not self.correlations['top_pairs']:
+            logging.warning("No numerical column pairs with a defined correlation, skipping correlation plots.")
+            return plots
+        pearson = self.correlations['pearson']
+        n = len(pearson.columns)
+        try:
+            size = min(max(8, 0.6 * n), 20)
+            with self.charts.figure((size, size * 0.85)) as fig:
+                ax = fig.subplots()
+                sns.heatmap(pearson, cmap='coolwarm', vmin=-1, vmax=1, center=0, square=True,
+                            annot=n <= 12, fmt='.2f', linewidths=0.5 if n <= 30 else 0, ax=ax)
+                ax.set_title('Correlation Heatmap (Pearson)', fontsize=16)
+                plots.append(self.charts.render(fig, 'Correlation Heatmap'))
+            logging.info("Generated correlation heatmap.")
+        except Exception as e:
+            logging.error(f"Error generating correlation heatmap: {e}")
+
+        for a, b, r, rho in self.correlations['top_pairs']:
+            title = f"{a.replace('_', ' ').title()} vs {b.replace('_', ' ').title()}"
+            try:
+                pair = self.df[[a, b]].dropna()
+                with self.charts.figure((10, 6)) as fig:
+                    ax = fig.subplots()
+                    if len(pair) > SCATTER_MAX_ROWS:
+                        # Binning keeps the cost and the image independent of the row count
+                        hexbin = ax.hexbin(pair[a], pair[b], gridsize=50, cmap='Blues', mincnt=1, bins='log')
+                        fig.colorbar(hexbin, ax=ax, label='Rows (log scale)')
+                    else:
+                        sns.scatterplot(data=pair, x=a, y=b, alpha=0.6, edgecolor=None, ax=ax)
+                    ax.set_title(f'{title} (Pearson r = {r:.2f}, Spearman ρ = {rho:.2f})', fontsize=16)
+                    ax.set_xlabel(a.replace('_', ' ').title(), fontsize=12)
+                    ax.set_ylabel(b.replace('_', ' ').title(), fontsize=12)
+                    plots.append(self.charts.render(fig, title))
+                logging.info(f"Generated relationship plot for {a} and {b}")
+            except Exception as e:
+                logging.error(f"Error generating relationship plot for {a} and {b}: {e}")
+        return plots
+
+    @contextmanager
+    def _stage(self, name):
+        """Records the duration (and, with track_memory, the peak allocation) of a pipeline stage."""
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = {'seconds': time.perf_counter() - start}
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                stats['peak_bytes'] = peak - baseline
+                stats['retained_bytes'] = current - baseline
+            self.stage_stats[name] = stats
+            metrics.STAGE_SECONDS.labels(name, self.engine.name).observe(stats['seconds'])
+
+    def _stratify_column(self):
+        """Picks the first low-cardinality categorical column to stratify samples by, if any."""
+        for col in self.df.select_dtypes(include=['object', 'string', 'category']).columns:
+            if 1 < self.df[col].nunique() <= 50:
+                return col
+        return None
+
+    def run_analysis(self, sample_size=None, total_rows=None):
+        """
+        Runs the full data cleaning and analysis pipeline.
+        If sample_size is given and the data has more rows, the pipeline runs on a
+        (stratified) random sample instead and the results are marked as approximate.
+        total_rows is the row count of the data the frame was already sampled from
+        by the caller (e.g. a low-memory read), if any.
+        """
+        sampling = None
+        method = 'uniform random'
+        total_rows = max(total_rows or 0, len(self.df))
+        if sample_size and len(self.df) > sample_size:
+            stratify_by = self._stratify_column()
+            self.df = sample_rows(self.df, sample_size, stratify_by=stratify_by)
+            if stratify_by:
+                method = f"stratified by '{stratify_by}'"
+        if len(self.df) < total_rows:
+            margin = sample_margin_of_error(len(self.df), total_rows)
+            sampling = {
+                'approximate': True,
+                'sample_rows': len(self.df),
+                'total_rows': total_rows,
+                'method': method,
+                'confidence_level': 0.95,
+                'margin_of_error': round(float(margin), 4),
+                'description': (f"Approximate results computed on a {method} sample of {len(self.df):,} "
+                                f"of {total_rows:,} rows. Proportions are within \u00b1{margin * 100:.2f}% "
+                                f"at 95% confidence."),
+            }
+            logging.info(sampling['description'])
+
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            with self._stage('initial_summary'):
+                initial_summary = self.summarize_data()
+            with self._stage('handle_missing_values'):
+                self.handle_missing_values()
+            with self._stage('convert_datatypes'):
+                self.convert_datatypes()
+            with self._stage('handle_outliers'):
+                self.handle_outliers()
+            with self._stage('encode_categoricals'):
+                self.encode_categoricals()
+            with self._stage('final_summary'):
+                final_summary = self.summarize_data() # Summarize again after cleaning
+            with self._stage('pairwise_analysis'):
+                top_correlations = self.analyze_correlations()
+            if top_correlations:
+                final_summary['top_correlations'] = top_correlations
+            with self._stage('generate_visualizations'):
+                plots = self.generate_visualizations()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        summaries = {'initial': initial_summary, 'final': final_summary}
+        # Structured statistics are kept apart from the rendered summaries
+        summaries['statistics'] = {'initial': initial_summary.pop('statistics'), 'final': final_summary.pop('statistics')}
+        if self.correlations:
+            summaries['statistics']['final']['top_correlations'] = [
+                {'column': str(a), 'other_column': str(b), 'pearson': _json_value(r), 'spearman': _json_value(rho)}
+                for a, b, r, rho in self.correlations['top_pairs']
+            ]
+        if sampling:
+            initial_summary['sampling'] = sampling['description']
+            final_summary['sampling'] = sampling['description']
+            summaries['sampling'] = sampling
+            for plot in plots:
+                plot['approximate'] = True
         print(f"\nAnalysis complete.")
-        return plots, {'initial': initial_summary, 'final': final_summary}
+        return plots, summaries
@@ -0,0 +1,420 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+from sklearn.impute import SimpleImputer
+
+from .column_executor import map_columns
+
+try:
+    import polars as pl
+except ImportError:  # optional engine
+    pl = None
+
+# Per-column stage functions. Each takes one column and returns its replacement
+# (or None to drop it), so the stages can run column-parallel via map_columns.
+
+PLACEHOLDER_VALUES = ['?', 'missing', 'Missing', 'NaN', 'nan', 'N/A', 'None', '']
+
+
+def _replace_placeholders(series):
+    if series.dtype != 'object':
+        return series
+    initial_nan_count = series.isnull().sum()
+    series = series.replace(PLACEHOLDER_VALUES, np.nan)
+    if series.isnull().sum() > initial_nan_count:
+        logging.info(f"Converted string placeholders to NaN in column '{series.name}'.")
+    return series
+
+
+def _impute_column(series):
+    col = series.name
+    if not series.isnull().any():
+        return series
+    if series.isnull().all(): # Only impute if not all values are NaN
+        kind = 'mean' if pd.api.types.is_numeric_dtype(series) else 'mode'
+        logging.warning(f"Column '{col}' is entirely NaN and cannot be imputed with {kind}. Consider dropping or alternative handling.")
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        logging.info(f"Imputed missing values in numerical column '{col}' with mean.")
+        return series.fillna(series.mean())
+    # Use SimpleImputer for categorical mode imputation to handle potential empty series from mode()
+    imputer = SimpleImputer(strategy='most_frequent')
+    imputed = imputer.fit_transform(series.to_frame()).ravel()
+    logging.info(f"Imputed missing values in categorical column '{col}' with mode.")
+    return pd.Series(imputed, index=series.index, name=col)
+
+
+def _convert_column(series):
+    col = series.name
+    # Try to convert to datetime first
+    if series.dtype == 'object':
+        try:
+            converted_datetime = pd.to_datetime(series, errors='coerce')
+            if not converted_datetime.isnull().all():
+                logging.info(f"Converted column '{col}' to datetime.")
+                return converted_datetime
+        except Exception as e:
+            logging.debug(f"Could not convert column '{col}' to datetime: {e}")
+
+    # Try to clean and convert to numeric
+    if series.dtype == 'object':
+        # Remove common non-numeric characters (to_numeric ignores surrounding whitespace).
+        # Columns holding only strings skip the astype(str) temporary.
+        as_text = series if pd.api.types.infer_dtype(series, skipna=True) == 'string' else series.astype(str)
+        cleaned_col = as_text.str.replace(r'[$,+%]', '', regex=True)
+
+        # Attempt to convert to numeric
+        converted_numeric = pd.to_numeric(cleaned_col, errors='coerce')
+
+        # If a significant portion could be converted and it's not all NaNs, update the column
+        if pd.api.types.is_numeric_dtype(converted_numeric) and converted_numeric.notna().sum() > 0.5 * len(series) and not converted_numeric.isnull().all():
+            series = converted_numeric
+            logging.info(f"Converted column '{col}' to numeric.")
+        elif converted_numeric.isnull().all():
+            logging.warning(f"Column '{col}' became entirely NaN after numeric conversion attempt. Keeping as object.")
+
+    # Convert float to int if all values are integers and not all are NaN
+    if pd.api.types.is_float_dtype(series) and not series.isnull().all() and (series.dropna() == series.dropna().astype(int)).all():
+        series = series.astype(int)
+        logging.info(f"Converted float column '{col}' to integer.")
+    return series
+
+
+def _cap_outliers(series, lower_percentile, upper_percentile):
+    # One sort for all four quantiles. Flooring only raises values below Q1, so the
+    # upper percentile of the floored column equals that of the original.
+    Q1, Q3, floor_value, cap_value = series.quantile([0.25, 0.75, lower_percentile, upper_percentile])
+    IQR = Q3 - Q1
+    lower_bound = Q1 - 1.5 * IQR
+    upper_bound = Q3 + 1.5 * IQR
+
+    # Cap/Floor outliers into a single output buffer
+    values = series.to_numpy(dtype='float64', na_value=np.nan)
+    low = values < lower_bound
+    high = values > upper_bound
+    print(f"Capped/floored outliers in numerical column '{series.name}'.")
+    if not (low.any() or high.any()):
+        return series if series.dtype == 'float64' else series.astype('float64')
+    if np.shares_memory(values, series.to_numpy()):
+        values = values.copy()
+    values[low] = floor_value
+    values[high] = cap_value
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def _label_encode(series):
+    col = series.name
+    # Heuristic to avoid encoding unique identifiers
+    if series.nunique() > 0.8 * len(series) or 'name' in col.lower() or 'id' in col.lower():
+        print(f"Skipping encoding for '{col}' (likely a unique identifier).")
+        return series
+    le = LabelEncoder()
+    encoded = le.fit_transform(series)
+    print(f"Label encoded column '{col}'.")
+    return pd.Series(encoded, index=series.index, name=col)
+
+
+class PandasEngine:
+    """
+    Reference engine. Frames are pandas DataFrames; every stage runs
+    column-parallel through map_columns.
+    """
+    name = 'pandas'
+
+    def __init__(self, n_jobs=None):
+        self.n_jobs = n_jobs
+
+    def from_pandas(self, df):
+        return df
+
+    def to_pandas(self, frame, index=None):
+        return frame
+
+    def replace_placeholders(self, frame):
+        return map_columns(frame, _replace_placeholders, max_workers=self.n_jobs)
+
+    def drop_sparse_columns(self, frame, drop_threshold):
+        missing_percentages = frame.isnull().mean()
+        keep = (missing_percentages <= drop_threshold).to_numpy()
+        for col, missing_percentage in missing_percentages[~keep].items():
+            _log_dropped(col, missing_percentage)
+        return frame.loc[:, keep]
+
+    def impute_missing(self, frame):
+        return map_columns(frame, _impute_column, max_workers=self.n_jobs)
+
+    def convert_datatypes(self, frame):
+        return map_columns(frame, _convert_column, max_workers=self.n_jobs)
+
+    def cap_outliers(self, frame, lower_percentile, upper_percentile):
+        return map_columns(
+            frame,
+            lambda series: _cap_outliers(series, lower_percentile, upper_percentile),
+            columns=frame.select_dtypes(include=np.number).columns,
+            max_workers=self.n_jobs,
+        )
+
+    def encode_categoricals(self, frame):
+        return map_columns(frame, _label_encode, columns=frame.select_dtypes(include='object').columns, max_workers=self.n_jobs)
+
+    def missing_counts(self, frame):
+        return frame.isnull().sum()
+
+    def describe(self, frame):
+        return frame.describe()
+
+    def value_counts(self, frame, col):
+        return frame[col].value_counts()
+
+
+class PolarsEngine:
+    """
+    Polars engine: columnar Arrow memory and multithreaded whole-frame
+    expressions instead of per-column Python calls. Each stage gathers the
+    statistics it needs in one select and applies all column rewrites in one
+    with_columns. Results match PandasEngine for object-dtype text columns;
+    every polars String column is treated as text.
+    """
+    name = 'polars'
+    DATETIME_PROBE_ROWS = 100
+
+    def __init__(self):
+        if pl is None:
+            raise ImportError("The polars engine requires the 'polars' package (pip install polars).")
+
+    def from_pandas(self, df):
+        if not all(isinstance(col, str) for col in df.columns):
+            df = df.rename(columns=str)
+        # Arrow needs single-typed columns; pd.read_csv yields mixed ints and strings
+        # in object columns of large files, so those are converted to text first
+        mixed = [col for col in df.select_dtypes(include='object').columns
+                 if pd.api.types.infer_dtype(df[col], skipna=True) in ('mixed', 'mixed-integer')]
+        if mixed:
+            df = df.assign(**{col: df[col].where(df[col].isna(), df[col].astype(str)) for col in mixed})
+        return pl.from_pandas(df, include_index=False)
+
+    def to_pandas(self, frame, index=None):
+        df = frame.to_pandas()
+        if index is not None and len(index) == len(df):
+            df.index = index
+        return df
+
+    @staticmethod
+    def _text_columns(frame):
+        return [col for col, dtype in frame.schema.items() if dtype == pl.String]
+
+    @staticmethod
+    def _numeric_columns(frame):
+        return [col for col, dtype in frame.schema.items() if dtype.is_numeric()]
+
+    @staticmethod
+    def _is_missing(col, dtype):
+        if dtype.is_float():
+            return pl.col(col).is_null() | pl.col(col).is_nan()
+        return pl.col(col).is_null()
+
+    def replace_placeholders(self, frame):
+        return frame.with_columns([
+            pl.when(pl.col(col).is_in(PLACEHOLDER_VALUES)).then(None).otherwise(pl.col(col)).alias(col)
+            for col in self._text_columns(frame)
+        ])
+
+    def drop_sparse_columns(self, frame, drop_threshold):
+        if frame.width == 0:
+            return frame
+        fractions = frame.select([self._is_missing(col, dtype).mean().alias(col) for col, dtype in frame.schema.items()]).row(0, named=True)
+        keep = []
+        for col in frame.columns:
+            if fractions[col] is not None and fractions[col] <= drop_threshold:
+                keep.append(col)
+            else:
+                _log_dropped(col, fractions[col] if fractions[col] is not None else np.nan)
+        return frame.select(keep)
+
+    def impute_missing(self, frame):
+        if frame.width == 0:
+            return frame
+        schema = frame.schema
+        missing = frame.select([self._is_missing(col, dtype).sum().alias(col) for col, dtype in schema.items()]).row(0, named=True)
+
+        fill_exprs = []
+        for col, dtype in schema.items():
+            if missing[col] == 0:
+                continue
+            kind = 'mean' if dtype.is_numeric() else 'mode'
+            if missing[col] == frame.height:
+                logging.warning(f"Column '{col}' is entirely NaN and cannot be imputed with {kind}. Consider dropping or alternative handling.")
+                continue
+            if dtype.is_numeric():
+                # Numeric columns with gaps are float in pandas, so impute as float
+                fill_exprs.append(pl.col(col).cast(pl.Float64).fill_nan(None).mean().alias(col))
+            else:
+                # Most frequent value; ties resolve to the smallest, like SimpleImputer
+                fill_exprs.append(pl.col(col).drop_nulls().mode().sort().first().alias(col))
+        if not fill_exprs:
+            return frame
+
+        fills = frame.select(fill_exprs).row(0, named=True)
+        rewrites = []
+        for col, value in fills.items():
+            if schema[col].is_numeric():
+                rewrites.append(pl.col(col).cast(pl.Float64).fill_nan(None).fill_null(value).alias(col))
+                logging.info(f"Imputed missing values in numerical column '{col}' with mean.")
+            else:
+                rewrites.append(pl.col(col).fill_null(pl.lit(value, dtype=schema[col])).alias(col))
+                logging.info(f"Imputed missing values in categorical column '{col}' with mode.")
+        return frame.with_columns(rewrites)
+
+    def convert_datatypes(self, frame):
+        height = frame.height
+        rewrites = []
+        candidates = []
+        for col in self._text_columns(frame):
+            # Try to convert to datetime first (format inferred from the data, as in pandas)
+            series = frame.get_column(col)
+            try:
+                # The format is inferred from the leading values; probe those first,
+                # a failed inference over the whole column is slow
+                series.drop_nulls().head(self.DATETIME_PROBE_ROWS).str.to_datetime(strict=False)
+                parsed = series.str.to_datetime(strict=False)
+            except pl.exceptions.PolarsError:
+                parsed = None
+            if parsed is not None and parsed.null_count() < height:
+                rewrites.append(parsed.alias(col))
+                logging.info(f"Converted column '{col}' to datetime.")
+            else:
+                candidates.append(col)
+
+        # Try to clean and convert to numeric, all candidate columns in one pass
+        cleaned = {
+            col: pl.col(col).str.replace_all(r'[$,+%]', '').str.strip_chars().cast(pl.Float64, strict=False).fill_nan(None)
+            for col in candidates
+        }
+        if cleaned:
+            counts = frame.select([expr.is_not_null().sum().alias(col) for col, expr in cleaned.items()]).row(0, named=True)
+            for col, expr in cleaned.items():
+                if counts[col] > 0.5 * height:
+                    rewrites.append(expr.alias(col))
+                    logging.info(f"Converted column '{col}' to numeric.")
+                elif counts[col] == 0:
+                    logging.warning(f"Column '{col}' became entirely NaN after numeric conversion attempt. Keeping as object.")
+        if rewrites:
+            frame = frame.with_columns(rewrites)
+
+        # Convert float to int if all values are integers and not all are NaN
+        float_cols = [col for col, dtype in frame.schema.items() if dtype.is_float()]
+        if float_cols:
+            integral = frame.select([
+                (pl.col(col).is_not_null().any() & (pl.col(col).drop_nulls() == pl.col(col).drop_nulls().floor()).all()).alias(col)
+                for col in float_cols
+            ]).row(0, named=True)
+            to_int = [col for col in float_cols if integral[col]]
+            for col in to_int:
+                logging.info(f"Converted float column '{col}' to integer.")
+            if to_int:
+                frame = frame.with_columns([pl.col(col).cast(pl.Int64) for col in to_int])
+        return frame
+
+    def cap_outliers(self, frame, lower_percentile, upper_percentile):
+        numeric = self._numeric_columns(frame)
+        if not numeric:
+            return frame
+        values = {col: pl.col(col).cast(pl.Float64).fill_nan(None) for col in numeric}
+        probs = {'q1': 0.25, 'q3': 0.75, 'floor': lower_percentile, 'cap': upper_percentile}
+        stats = frame.select([
+            expr.quantile(p, interpolation='linear').alias(f"{name}:{col}")
+            for col, expr in values.items() for name, p in probs.items()
+        ]).row(0, named=True)
+
+        rewrites = []
+        for col, expr in values.items():
+            q1, q3 = stats[f"q1:{col}"], stats[f"q3:{col}"]
+            if q1 is None or q3 is None:
+                rewrites.append(expr.alias(col))
+                continue
+            iqr = q3 - q1
+            rewrites.append(
+                pl.when(expr < q1 - 1.5 * iqr).then(pl.lit(stats[f"floor:{col}"]))
+                .when(expr > q3 + 1.5 * iqr).then(pl.lit(stats[f"cap:{col}"]))
+                .otherwise(expr)
+                .alias(col)
+            )
+        logging.info(f"Capped/floored outliers in {len(numeric)} numerical columns.")
+        return frame.with_columns(rewrites)
+
+    def encode_categoricals(self, frame):
+        text = self._text_columns(frame)
+        if not text:
+            return frame
+        unique_counts = frame.select([pl.col(col).drop_nulls().n_unique().alias(col) for col in text]).row(0, named=True)
+        rewrites = []
+        for col in text:
+            # Heuristic to avoid encoding unique identifiers
+            if unique_counts[col] > 0.8 * frame.height or 'name' in col.lower() or 'id' in col.lower():
+                logging.info(f"Skipping encoding for '{col}' (likely a unique identifier).")
+                continue
+            # Dense rank of the sorted categories gives the same codes as LabelEncoder
+            rewrites.append((pl.col(col).rank('dense') - 1).cast(pl.Int64).alias(col))
+            logging.info(f"Label encoded column '{col}'.")
+        return frame.with_columns(rewrites) if rewrites else frame
+
+    def missing_counts(self, frame):
+        counts = frame.select([self._is_missing(col, dtype).sum().alias(col) for col, dtype in frame.schema.items()])
+        return pd.Series(counts.row(0) if frame.width else [], index=frame.columns, dtype='int64')
+
+    def describe(self, frame):
+        numeric = self._numeric_columns(frame)
+        has_datetimes = any(dtype.is_temporal() for dtype in frame.schema.values())
+        if not numeric or has_datetimes:
+            # Same layout as pandas for the less common cases
+            return self.to_pandas(frame).describe()
+        stats = [
+            ('count', lambda e: e.count().cast(pl.Float64)),
+            ('mean', lambda e: e.mean()),
+            ('std', lambda e: e.std()),
+            ('min', lambda e: e.min()),
+            ('25%', lambda e: e.quantile(0.25, interpolation='linear')),
+            ('50%', lambda e: e.quantile(0.5, interpolation='linear')),
+            ('75%', lambda e: e.quantile(0.75, interpolation='linear')),
+            ('max', lambda e: e.max()),
+        ]
+        row = frame.select([
+            func(pl.col(col).cast(pl.Float64).fill_nan(None)).alias(f"{name}:{col}")
+            for col in numeric for name, func in stats
+        ]).row(0, named=True)
+        return pd.DataFrame(
+            [[row[f"{name}:{col}"] for col in numeric] for name, _ in stats],
+            index=[name for name, _ in stats],
+            columns=numeric,
+            dtype='float64',
+        )
+
+    def value_counts(self, frame, col):
+        counts = frame.get_column(col).drop_nulls().value_counts(sort=True)
+        return pd.Series(counts[:, 1].to_list(), index=counts[:, 0].to_list(), name='count')
+
+
+ENGINES = {'pandas': PandasEngine, 'polars': PolarsEngine}
+
+
+def get_engine(name=None, n_jobs=None):
+    """
+    Returns an engine instance by name ('pandas', 'polars' or 'auto').
+    Defaults to the ANALYZER_ENGINE environment variable, else 'pandas'.
+    'auto' picks polars when it is installed.
+    """
+    name = name or os.environ.get('ANALYZER_ENGINE', 'pandas')
+    if name == 'auto':
+        name = 'polars' if pl is not None else 'pandas'
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine: {name}. Choose from {', '.join(ENGINES)} or 'auto'.")
+    if name == 'pandas':
+        return PandasEngine(n_jobs=n_jobs)
+    return ENGINES[name]()
+
+
+def _log_dropped(col, missing_percentage):
+    logging.info(f"Column '{col}' dropped due to high missing value percentage ({missing_percentage*100:.2f}% missing).")
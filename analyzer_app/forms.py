@@ -12,4 +12,13 @@ class DataUploadForm(forms.Form):
         required=False,
         label="Recipient Email (Optional)",
         help_text="If you want the results emailed to you, enter your email address here."
-    )
\ No newline at end of file
+    )
+
+
+class ChunkedUploadStartForm(forms.Form):
+    """Metadata sent by the browser before it starts uploading a file in chunks."""
+    filename = forms.CharField(max_length=255)
+    file_type = forms.ChoiceField(choices=[('csv', 'CSV'), ('excel', 'Excel')])
+    total_size = forms.IntegerField(min_value=1)
+    # The first bytes of the file, so the upload is planned against the memory budgets before it is sent
+    head = forms.FileField(required=False)
@@ -0,0 +1,81 @@
+import functools
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Prometheus metrics for the upload/analysis/download paths.
+# Under gunicorn, PROMETHEUS_MULTIPROC_DIR must point to a directory shared by
+# the workers (gunicorn.conf.py sets it up): every worker then writes its samples
+# to memory-mapped files there and /metrics aggregates them across workers.
+# Recording a sample is an in-memory update, so instrumenting a request is cheap.
+
+SIZE_BUCKETS = (10e3, 100e3, 1e6, 5e6, 10e6, 50e6, 100e6, 500e6, 1e9)
+ROW_BUCKETS = (100, 1e3, 1e4, 1e5, 1e6, 1e7)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUESTS = Counter(
+    'analyzer_requests', 'Requests handled by the instrumented views.', ['view', 'status'])
+REQUEST_SECONDS = Histogram(
+    'analyzer_request_duration_seconds', 'Time spent in the instrumented views.', ['view'], buckets=SECONDS_BUCKETS)
+UPLOAD_BYTES = Histogram(
+    'analyzer_upload_size_bytes', 'Size of uploaded files.', ['file_type'], buckets=SIZE_BUCKETS)
+UPLOAD_ROWS = Histogram(
+    'analyzer_upload_rows', 'Rows in successfully parsed uploads.', buckets=ROW_BUCKETS)
+UPLOAD_ERRORS = Counter(
+    'analyzer_upload_errors', 'Uploads that could not be analysed.', ['reason'])
+STAGE_SECONDS = Histogram(
+    'analyzer_stage_duration_seconds', 'Duration of DataAnalyzer pipeline stages.', ['stage', 'engine'], buckets=SECONDS_BUCKETS)
+CHARTS_RENDERED = Counter(
+    'analyzer_charts_rendered', 'Charts rendered by DataAnalyzer.')
+SESSION_PAYLOAD_BYTES = Histogram(
+    'analyzer_session_payload_bytes', 'Size of the plots and summaries stored in the session.', buckets=SIZE_BUCKETS)
+DOWNLOAD_BYTES = Histogram(
+    'analyzer_download_size_bytes', 'Size of download responses.', ['kind'], buckets=SIZE_BUCKETS)
+BACKGROUND_ANALYSES = Gauge(
+    'analyzer_background_analyses', 'Full-data analyses queued or running in the background.', multiprocess_mode='livesum')
+ADMISSION_DECISIONS = Counter(
+    'analyzer_admission_decisions', 'Admission control outcomes (full, downsample, low_memory, rejected, timeout).', ['mode'])
+ADMISSION_QUEUE_SECONDS = Histogram(
+    'analyzer_admission_queue_seconds', 'Time uploads waited for memory before being admitted.', buckets=SECONDS_BUCKETS)
+ADMISSION_RESERVED_BYTES = Gauge(
+    'analyzer_admission_reserved_bytes', 'Memory reserved by running analyses.', multiprocess_mode='livesum')
+
+
+def instrument_view(name):
+    """Counts the view's responses by status code and records its latency."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = time.perf_counter()
+            status = 500 # Unhandled exceptions end up as server errors
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                REQUEST_SECONDS.labels(name).observe(time.perf_counter() - start)
+                REQUESTS.labels(name, str(status)).inc()
+        return wrapper
+    return decorator
+
+
+def payload_size(plots, summaries):
+    """Approximate size of the results kept in the session (chart images live in the artifact store)."""
+    size = sum(len(str(plot)) for plot in plots)
+    for summary in summaries.values():
+        if isinstance(summary, dict):
+            size += sum(len(str(value)) for value in summary.values())
+    return size
+
+
+def render_latest():
+    """Returns (body, content type) for the Prometheus text exposition format."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
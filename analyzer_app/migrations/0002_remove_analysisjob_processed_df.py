@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-19 01:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='analysisjob',
+            name='processed_df',
+        ),
+    ]
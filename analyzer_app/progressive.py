@@ -0,0 +1,116 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .artifacts import default_store
+from .data_analyzer import DataAnalyzer
+from .metrics import BACKGROUND_ANALYSES
+from .models import AnalysisJob
+from .utils import send_analysis_email
+
+
+def start_full_analysis(df, artifact_id, recipient_email=None, reservation=None):
+    """
+    Creates an AnalysisJob and runs the full-data analysis for it in a background thread.
+    The processed data is written to the upload's artifact when the run finishes.
+    The admission-control reservation, if given, is released when the run ends.
+    """
+    job = AnalysisJob.objects.create()
+    BACKGROUND_ANALYSES.inc()
+    thread = threading.Thread(
+        target=_run_full_analysis,
+        args=(job.pk, df, artifact_id, recipient_email, reservation),
+        name=f"analysis-{job.pk}",
+        daemon=True,
+    )
+    thread.start()
+    logging.info(f"Started background full-data analysis {job.pk} ({len(df)} rows).")
+    return job
+
+
+def _run_full_analysis(job_id, df, artifact_id, recipient_email, reservation=None):
+    try:
+        analyzer = DataAnalyzer(df=df)
+        plots, summaries = analyzer.run_analysis()
+        store = default_store()
+        store.save_processed(artifact_id, df, analyzer.df)
+        AnalysisJob.objects.filter(pk=job_id).update(
+            status=AnalysisJob.STATUS_COMPLETE,
+            plots=store.save_charts(artifact_id, plots),
+            summaries=summaries,
+        )
+        logging.info(f"Background full-data analysis {job_id} complete.")
+        if recipient_email:
+            try:
+                send_analysis_email(recipient_email, "Data Analysis Visualizations", "Please find attached the data analysis visualizations.", plots)
+            except Exception as e:
+                logging.error(f"Failed to send email for analysis {job_id}: {e}")
+    except Exception as e:
+        logging.error(f"Background full-data analysis {job_id} failed: {e}", exc_info=True)
+        AnalysisJob.objects.filter(pk=job_id).update(status=AnalysisJob.STATUS_FAILED, error=str(e))
+    finally:
+        BACKGROUND_ANALYSES.dec()
+        if reservation:
+            reservation.release()
+        # Threads get their own DB connection; don't leak it
+        connection.close()
+
+
+def collect_job_results(session):
+    """
+    Moves the results of a finished background job into the session.
+    Returns the job status ('complete' when there is no pending job).
+    """
+    job_id = session.get('analysis_job_id')
+    if not job_id:
+        return AnalysisJob.STATUS_COMPLETE
+
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    if job is None:
+        session['analysis_job_id'] = None
+        return AnalysisJob.STATUS_COMPLETE
+
+    if job.status == AnalysisJob.STATUS_RUNNING and _is_stale(job):
+        # The worker running the job most likely died with its thread
+        logging.warning(f"Background full-data analysis {job.pk} did not finish in time, marking it as failed.")
+        job.status = AnalysisJob.STATUS_FAILED
+        job.error = (f"it did not finish within {settings.PROGRESSIVE_ANALYSIS_MAX_SECONDS // 60} minutes "
+                     "(the server may have restarted)")
+        AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.STATUS_RUNNING).update(status=job.status, error=job.error)
+
+    if job.status == AnalysisJob.STATUS_COMPLETE:
+        session['plots'] = job.plots
+        session['summaries'] = job.summaries
+    elif job.status == AnalysisJob.STATUS_FAILED:
+        session['analysis_error'] = job.error
+    else:
+        return job.status
+
+    session['analysis_job_id'] = None
+    session.modified = True
+    job.delete()
+    return job.status
+
+
+def job_running(job_id):
+    """Whether the job is still running (and not past PROGRESSIVE_ANALYSIS_MAX_SECONDS)."""
+    if not job_id:
+        return False
+    job = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.STATUS_RUNNING).first()
+    return job is not None and not _is_stale(job)
+
+
+def purge_expired_jobs(max_age_seconds):
+    """Deletes jobs older than max_age_seconds, including ones no session collected."""
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    deleted, _ = AnalysisJob.objects.filter(created_at__lt=cutoff).delete()
+    if deleted:
+        logging.info(f"Deleted {deleted} expired analysis job(s).")
+
+
+def _is_stale(job):
+    return job.created_at < timezone.now() - timedelta(seconds=settings.PROGRESSIVE_ANALYSIS_MAX_SECONDS)
@@ -0,0 +1,245 @@
+import hashlib
+import io
+import json
+import logging
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, urlencode
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from . import metrics
+from .artifacts import default_store
+from .metrics import instrument_view
+from .progressive import collect_job_results
+
+# Versioned, machine-readable access to the analysis results of the session.
+# - The manifest is JSON: structured statistics, chart references and data links, no HTML.
+# - Charts and data are fetched separately, so clients only download what they use.
+# - Data is exported as Arrow IPC (stream format) or Parquet, both zstd-compressed,
+#   with column selection (?columns=a,b) and row pagination (?offset=&limit=).
+# - Every response carries an ETag; a matching If-None-Match returns 304 without a body.
+
+API_VERSION = 1
+DEFAULT_PAGE_ROWS = 100_000
+MAX_PAGE_ROWS = 1_000_000
+DATA_TYPES = ('original', 'processed')
+EXPORT_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+COMPRESSION = 'zstd'
+
+
+class ApiError(Exception):
+    """A client error, returned as {'error': message} with the given status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_columns(value):
+    """The ?columns= list (comma-separated), or None when all columns are wanted."""
+    if not value:
+        return None
+    columns = [col.strip() for col in value.split(',') if col.strip()]
+    return list(dict.fromkeys(columns)) or None
+
+
+def parse_page(params):
+    """(offset, limit) from the query parameters, limit capped at MAX_PAGE_ROWS."""
+    try:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', DEFAULT_PAGE_ROWS))
+    except (TypeError, ValueError):
+        raise ApiError("offset and limit must be integers")
+    if offset < 0 or limit < 1:
+        raise ApiError("offset must be >= 0 and limit >= 1")
+    return offset, min(limit, MAX_PAGE_ROWS)
+
+
+def select_statistics(statistics, columns):
+    """Restricts each stage's per-column statistics (and correlated pairs) to the given columns."""
+    if columns is None:
+        return statistics
+    wanted = set(columns)
+    selected = {}
+    for stage, stats in statistics.items():
+        stats = dict(stats)
+        stats['columns'] = [col for col in stats.get('columns', []) if col['name'] in wanted]
+        stats['describe'] = {col: values for col, values in stats.get('describe', {}).items() if col in wanted}
+        if 'top_correlations' in stats:
+            stats['top_correlations'] = [pair for pair in stats['top_correlations']
+                                         if pair['column'] in wanted or pair['other_column'] in wanted]
+        selected[stage] = stats
+    return selected
+
+
+def encode_table(df, fmt):
+    """Serialises a DataFrame as a compressed Arrow IPC stream or Parquet file."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    if fmt == 'arrow':
+        options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+    elif fmt == 'parquet':
+        pq.write_table(table, sink, compression=COMPRESSION)
+    else:
+        raise ApiError(f"Unknown format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}")
+    return sink.getvalue()
+
+
+def _etag(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return quote_etag(digest.hexdigest()[:32])
+
+
+def _conditional(request, etag, build):
+    """Returns 304 when the client's copy matches etag, else build() with the ETag set."""
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = build()
+        response['ETag'] = etag
+    else:
+        response = not_modified
+    # Results are per session and replaced when a background analysis finishes
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _error(error):
+    return JsonResponse({'error': error.message}, status=error.status)
+
+
+def build_manifest(request, status):
+    """The JSON manifest of the session's results."""
+    session = request.session
+    plots = session.get('plots', [])
+    summaries = session.get('summaries', {})
+    columns = parse_columns(request.GET.get('columns'))
+
+    manifest = {
+        'api_version': API_VERSION,
+        'status': status,
+        'error': session.get('analysis_error'),
+        'approximate': bool(summaries.get('sampling')),
+        'sampling': summaries.get('sampling'),
+        'admission': summaries.get('admission'),
+        'statistics': select_statistics(summaries.get('statistics', {}), columns),
+        'charts': [{
+            'index': index,
+            'title': plot['title'],
+            'approximate': bool(plot.get('approximate')),
+            'format': plot['format'],
+            'content_type': plot['content_type'],
+            'url': reverse('analyzer_app:api_results_chart', args=[index]),
+        } for index, plot in enumerate(plots)],
+        'data': {},
+    }
+
+    artifact_id = session.get('artifact_id')
+    store = default_store()
+    if artifact_id and store.exists(artifact_id):
+        for data_type in DATA_TYPES:
+            try:
+                available = store.column_names(artifact_id, processed=data_type == 'processed')
+            except FileNotFoundError:
+                continue
+            manifest['data'][data_type] = {
+                'url': reverse('analyzer_app:api_results_data', args=[data_type]),
+                'formats': list(EXPORT_FORMATS),
+                'columns': available,
+            }
+    return manifest
+
+
+@instrument_view('api_results')
+@require_GET
+@gzip_page
+def results_manifest(request):
+    status = collect_job_results(request.session)
+    if not request.session.get('plots') and not request.session.get('summaries'):
+        return JsonResponse({'error': "No analysis results in this session"}, status=404)
+
+    body = json.dumps(build_manifest(request, status), allow_nan=False).encode()
+    return _conditional(request, _etag(body),
+                        lambda: HttpResponse(body, content_type='application/json'))
+
+
+@instrument_view('api_results_chart')
+@require_GET
+def results_chart(request, index):
+    plots = request.session.get('plots', [])
+    artifact_id = request.session.get('artifact_id')
+    store = default_store()
+    if not 0 <= index < len(plots) or not artifact_id or not store.exists(artifact_id):
+        return JsonResponse({'error': "Chart not found"}, status=404)
+    plot = plots[index]
+
+    def build():
+        image = store.load_chart(artifact_id, plot)
+        metrics.DOWNLOAD_BYTES.labels('api_chart').observe(len(image))
+        return HttpResponse(image, content_type=plot['content_type'])
+
+    # Chart files are named by their content hash
+    return _conditional(request, _etag(plot['file']), build)
+
+
+@instrument_view('api_results_data')
+@require_GET
+def results_data(request, data_type):
+    if data_type not in DATA_TYPES:
+        return JsonResponse({'error': f"Unknown data type {data_type!r}"}, status=404)
+    artifact_id = request.session.get('artifact_id')
+    store = default_store()
+    if not artifact_id or not store.exists(artifact_id):
+        return JsonResponse({'error': "No analysis data in this session"}, status=404)
+
+    try:
+        fmt = request.GET.get('format', 'arrow')
+        if fmt not in EXPORT_FORMATS:
+            raise ApiError(f"Unknown format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}")
+        columns = parse_columns(request.GET.get('columns'))
+        offset, limit = parse_page(request.GET)
+        processed = data_type == 'processed'
+        if columns is not None:
+            unknown = [col for col in columns if col not in store.column_names(artifact_id, processed=processed)]
+            if unknown:
+                raise ApiError(f"Unknown columns: {', '.join(unknown)}")
+    except ApiError as e:
+        return _error(e)
+
+    etag = _etag(artifact_id, data_type, store.version(artifact_id), fmt, columns, offset, limit)
+
+    def build():
+        # Only the selected columns and the row groups of the requested page are read
+        # from the Parquet artifacts; the total comes from their metadata
+        load = store.load_processed if processed else store.load_original
+        total = store.row_count(artifact_id, processed=processed)
+        body = encode_table(load(artifact_id, columns=columns, offset=offset, limit=limit), fmt)
+        metrics.DOWNLOAD_BYTES.labels(f"api_{data_type}_data").observe(len(body))
+        logging.info(f"Exported {data_type} data of artifact {artifact_id} as {fmt} "
+                     f"(rows {offset}-{min(offset + limit, total)} of {total}, {len(body)} bytes).")
+
+        content_type, extension = EXPORT_FORMATS[fmt]
+        response = HttpResponse(body, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{data_type}_data.{extension}"'
+        response['X-Total-Count'] = str(total)
+        if offset + limit < total:
+            params = request.GET.copy()
+            params['offset'] = str(offset + limit)
+            params['limit'] = str(limit)
+            response['Link'] = f'<{request.path}?{urlencode(sorted(params.items()))}>; rel="next"'
+        return response
+
+    return _conditional(request, etag, build)
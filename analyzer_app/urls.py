@@ -1,12 +1,23 @@
 from django.urls import path
-from . import views
+from . import views, results_api
 
 app_name = 'analyzer_app'
 
 urlpatterns = [
     path('', views.upload_file, name='upload_file'),
+    path('upload/chunked/', views.chunked_upload_start, name='chunked_upload_start'),
+    path('upload/chunked/<str:upload_id>/', views.chunked_upload_status, name='chunked_upload_status'),
+    path('upload/chunked/<str:upload_id>/chunk/<int:index>/', views.chunked_upload_chunk, name='chunked_upload_chunk'),
+    path('upload/chunked/<str:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
+    path('results/', views.view_results, name='view_results'),
+    path('analysis_status/', views.analysis_status, name='analysis_status'),
     path('download_plot/<int:plot_index>/', views.download_plot, name='download_plot'),
     path('download_summary/<str:summary_type>/', views.download_summary, name='download_summary'),
     path('download_data/<str:data_type>/', views.download_data, name='download_data'),
     path('download_all_plots/', views.download_all_plots, name='download_all_plots'),
+    path('admission/status/', views.admission_status, name='admission_status'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('api/v1/results/', results_api.results_manifest, name='api_results'),
+    path('api/v1/results/charts/<int:index>/', results_api.results_chart, name='api_results_chart'),
+    path('api/v1/results/data/<str:data_type>/', results_api.results_data, name='api_results_data'),
 ]
@@ -3,7 +3,6 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email import encoders
-import base64
 import os
 
 def send_analysis_email(recipient_email, subject, body_text, plots):
@@ -21,12 +20,11 @@ def send_analysis_email(recipient_email, subject, body_text, plots):
     msg.attach(MIMEText(body_text, 'plain'))
 
     for i, plot_info in enumerate(plots):
-        part = MIMEBase('application', 'octet-stream')
-        # Decode the base64 string back to bytes
-        image_bytes = base64.b64decode(plot_info['image'])
-        part.set_payload(image_bytes)
+        # plot_info['image'] holds the raw image bytes
+        part = MIMEBase(*plot_info['content_type'].split('/'))
+        part.set_payload(plot_info['image'])
         encoders.encode_base64(part)
-        part.add_header('Content-Disposition', f"attachment; filename= {plot_info['title'].replace(' ', '_')}_{i+1}.png")
+        part.add_header('Content-Disposition', f"attachment; filename= {plot_info['title'].replace(' ', '_')}_{i+1}.{plot_info['format']}")
         msg.attach(part)
 
     try:
@@ -1,8 +1,19 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_http_methods
-from .forms import DataUploadForm
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from .forms import DataUploadForm, ChunkedUploadStartForm
+from . import chunked_upload
+from .chunked_upload import ChunkedUploadError
 from .data_analyzer import DataAnalyzer
+from .progressive import start_full_analysis, collect_job_results, purge_expired_jobs, job_running
+from .artifacts import default_store, session_artifact_ids
+from . import metrics
+from .metrics import instrument_view
+from . import admission
+from .admission import AdmissionRejected
 import chardet
 import csv
 from .utils import send_analysis_email
@@ -14,73 +25,306 @@ from django.urls import reverse
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _analyze_and_store(request, df, recipient_email=None, reservation=None, total_rows=None):
+    """
+    Runs the analysis on an uploaded DataFrame, stores the results for the session and returns the results context.
+    reservation is the upload's admission-control reservation; in the downsample and low-memory
+    modes only a sample is analysed and no full-data run follows.
+    """
+    mode = reservation.mode if reservation else admission.MODE_FULL
+    sample_size = None
+    run_full_later = False
+    if mode == admission.MODE_DOWNSAMPLE:
+        sample_size = reservation.sample_rows
+    elif mode == admission.MODE_FULL and len(df) > settings.PROGRESSIVE_ANALYSIS_ROW_THRESHOLD:
+        # Large uploads are analysed on a sample first; the full run finishes in the background
+        sample_size = settings.PROGRESSIVE_SAMPLE_SIZE
+        run_full_later = True
+
+    # DataAnalyzer never writes into the frame it is given, so under Copy-on-Write
+    # `df` and `analyzer.df` share every column the pipeline leaves unchanged.
+    # Reduced modes also run the column stages serially to avoid concurrent column copies.
+    analyzer = DataAnalyzer(df=df, n_jobs=1 if mode != admission.MODE_FULL else None)
+    plots, summaries = analyzer.run_analysis(sample_size=sample_size, total_rows=total_rows)
+    if mode != admission.MODE_FULL:
+        summaries['admission'] = {
+            'mode': mode,
+            'description': ("This file is larger than the server's memory budget allows for a full analysis, "
+                            "so only a sample was analysed."),
+        }
+    metrics.UPLOAD_ROWS.observe(len(df))
+
+    # Store the original once, the processed data as a column delta and the chart images;
+    # the session only keeps the artifact id and chart references for the download views
+    store = default_store()
+    store.purge_expired(settings.SESSION_COOKIE_AGE, in_use=session_artifact_ids)
+    purge_expired_jobs(settings.SESSION_COOKIE_AGE)
+    artifact_id = store.save_original(df)
+    store.save_processed(artifact_id, df, analyzer.df)
+    charts = store.save_charts(artifact_id, plots)
+    metrics.SESSION_PAYLOAD_BYTES.observe(metrics.payload_size(charts, summaries))
+
+    # The session's previous upload is replaced; its data goes too unless its
+    # background run still writes to it (the purge removes it later)
+    previous_id = request.session.get('artifact_id')
+    if previous_id and not job_running(request.session.get('analysis_job_id')):
+        store.delete(previous_id)
+
+    # Ensure session is saved explicitly
+    request.session['artifact_id'] = artifact_id
+    request.session['plots'] = charts
+    request.session['summaries'] = summaries
+    request.session['analysis_job_id'] = None
+    request.session['analysis_error'] = None
+    request.session.modified = True  # Explicitly mark session as modified
+
+    email_sent_message = None
+    if run_full_later:
+        # The background run owns the upload's memory reservation from here on
+        job = start_full_analysis(df, artifact_id, recipient_email=recipient_email,
+                                  reservation=reservation.transfer() if reservation else None)
+        request.session['analysis_job_id'] = str(job.pk)
+        if recipient_email:
+            email_sent_message = f"Full analysis results will be sent to {recipient_email} when processing completes"
+    elif recipient_email:
+        try:
+            send_analysis_email(recipient_email, "Data Analysis Visualizations", "Please find attached the data analysis visualizations.", plots)
+            email_sent_message = f"Analysis results sent to {recipient_email}"
+        except Exception as e:
+            email_sent_message = f"Failed to send email: {e}"
+
+    return {
+        'plots': charts,
+        'summaries': summaries,
+        'email_sent_message': email_sent_message,
+        'analysis_pending': run_full_later,
+    }
+
+
+@instrument_view('upload_file')
 def upload_file(request):
     if request.method == 'POST':
         form = DataUploadForm(request.POST, request.FILES)
         if form.is_valid():
             uploaded_file = request.FILES['data_file']
             file_type = form.cleaned_data['file_type']
+            metrics.UPLOAD_BYTES.labels(file_type).observe(uploaded_file.size)
             df = None
+            total_rows = None
             error_message = None
 
+            # Plan the analysis against the memory budgets before parsing anything
+            try:
+                head = uploaded_file.read(admission.SNIFF_BYTES)
+                uploaded_file.seek(0)
+                estimate = admission.estimate_upload(file_type, uploaded_file.size, head)
+                reservation = admission.default_controller().admit(estimate)
+            except AdmissionRejected as e:
+                metrics.UPLOAD_ERRORS.labels('admission').inc()
+                return render(request, 'analyzer_app/index.html', {'form': form, 'error_message': str(e)}, status=e.status)
+
             try:
-                if file_type == 'csv':
+                if reservation.mode == admission.MODE_LOW_MEMORY:
+                    # Stream the file and keep only a sample of its rows
+                    df, total_rows = admission.read_csv_sample(uploaded_file, estimate, reservation.sample_rows)
+                elif file_type == 'csv':
                     # Read a sample to detect encoding and delimiter
                     raw_data = uploaded_file.read()
                     result = chardet.detect(raw_data)
                     encoding = result['encoding'] if result['encoding'] else 'utf-8'
                     
-                    # Try to detect delimiter
+                    # Try to detect delimiter (only the head is decoded; no full-text copy)
                     try:
-                        sample = raw_data.decode(encoding).splitlines(True)[:5]
+                        sample = raw_data[:65536].decode(encoding, errors='ignore').splitlines(True)[:5]
                         dialect = csv.Sniffer().sniff(''.join(sample))
                         delimiter = dialect.delimiter
                     except csv.Error:
                         delimiter = ',' # Default to comma if sniffing fails
 
-                    df = pd.read_csv(io.StringIO(raw_data.decode(encoding)), sep=delimiter)
+                    # Parse straight from the bytes and drop them before the analysis starts
+                    df = pd.read_csv(io.BytesIO(raw_data), sep=delimiter, encoding=encoding)
+                    del raw_data
                 elif file_type == 'excel':
                     df = pd.read_excel(uploaded_file)
                 
                 if df is None or df.empty:
+                    metrics.UPLOAD_ERRORS.labels('empty').inc()
                     error_message = "The uploaded file is empty or could not be read."
                     return render(request, 'analyzer_app/index.html', {'form': form, 'error_message': error_message})
                 
-                analyzer = DataAnalyzer(df=df)
-                plots, summaries = analyzer.run_analysis()
-
-                # Store data in session for download functionality
-                # Ensure session is saved explicitly
-                request.session['original_df'] = df.to_json()
-                request.session['processed_df'] = analyzer.df.to_json()
-                request.session['plots'] = plots
-                request.session['summaries'] = summaries
-                request.session.modified = True  # Explicitly mark session as modified
-
-                email_sent_message = None
-                recipient_email = form.cleaned_data.get('recipient_email')
-                if recipient_email:
-                    try:
-                        send_analysis_email(recipient_email, "Data Analysis Visualizations", "Please find attached the data analysis visualizations.", plots)
-                        email_sent_message = f"Analysis results sent to {recipient_email}"
-                    except Exception as e:
-                        email_sent_message = f"Failed to send email: {e}"
-
-                return render(request, 'analyzer_app/results.html', {
-                    'plots': plots, 
-                    'summaries': summaries, 
-                    'email_sent_message': email_sent_message
-                })
+                context = _analyze_and_store(request, df, form.cleaned_data.get('recipient_email'),
+                                             reservation=reservation, total_rows=total_rows)
+                return render(request, 'analyzer_app/results.html', context)
 
             except Exception as e:
+                metrics.UPLOAD_ERRORS.labels('processing').inc()
                 error_message = f"Error processing file: {e}"
                 logging.error(f"File processing error: {e}", exc_info=True)
                 return render(request, 'analyzer_app/index.html', {'form': form, 'error_message': error_message})
+            finally:
+                reservation.release()
     else:
         form = DataUploadForm()
     return render(request, 'analyzer_app/index.html', {'form': form})
 
 
+def _chunked_upload_id(request, upload_id):
+    """Only the session that started an upload may send chunks for it or complete it."""
+    if upload_id not in request.session.get('chunked_uploads', []):
+        raise ChunkedUploadError(f"Unknown upload: {upload_id}")
+    return upload_id
+
+
+@require_http_methods(['POST'])
+def chunked_upload_start(request):
+    form = ChunkedUploadStartForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors.get_json_data()}, status=400)
+    file_type = form.cleaned_data['file_type']
+    total_size = form.cleaned_data['total_size']
+
+    # Reject uploads that cannot be analysed before any chunk is sent; a CSV upload
+    # without a head is planned from its chunk 0 instead
+    estimate = None
+    head = form.cleaned_data.get('head')
+    if head or file_type == 'excel':
+        estimate = admission.estimate_upload(file_type, total_size, head.read(admission.SNIFF_BYTES) if head else b'')
+        try:
+            admission.default_controller().plan(estimate)
+        except AdmissionRejected as e:
+            metrics.ADMISSION_DECISIONS.labels('rejected').inc()
+            metrics.UPLOAD_ERRORS.labels('admission').inc()
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+    store = chunked_upload.default_store()
+    store.purge_expired(settings.CHUNKED_UPLOAD_MAX_AGE)
+    chunked_upload.purge_idle_parsers(store)
+    meta = store.start(
+        form.cleaned_data['filename'],
+        file_type,
+        total_size,
+        settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        estimate=estimate,
+    )
+    request.session['chunked_uploads'] = request.session.get('chunked_uploads', [])[-9:] + [meta['upload_id']]
+    return JsonResponse({**meta, 'received': []})
+
+
+@require_http_methods(['GET'])
+def chunked_upload_status(request, upload_id):
+    try:
+        store = chunked_upload.default_store()
+        meta = store.meta(_chunked_upload_id(request, upload_id))
+        return JsonResponse({**meta, 'received': store.received(upload_id)})
+    except ChunkedUploadError as e:
+        return JsonResponse({'error': str(e)}, status=404)
+
+
+@require_http_methods(['PUT'])
+def chunked_upload_chunk(request, upload_id, index):
+    store = chunked_upload.default_store()
+    try:
+        store.save_chunk(_chunked_upload_id(request, upload_id), index, request.body, request.headers.get('X-Chunk-SHA256'))
+    except ChunkedUploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Parse whatever contiguous data has arrived while later chunks are still in flight
+    try:
+        chunked_upload.chunk_received(store, upload_id, index, admission.default_controller())
+    except Exception as e:
+        logging.warning(f"Incremental parsing of upload {upload_id} deferred: {e}")
+    return JsonResponse({'received': index})
+
+
+@instrument_view('chunked_upload_complete')
+@require_http_methods(['POST'])
+def chunked_upload_complete(request, upload_id):
+    store = chunked_upload.default_store()
+    try:
+        missing = store.missing(_chunked_upload_id(request, upload_id))
+    except ChunkedUploadError as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    if missing:
+        # The upload stays resumable; the client sends the missing chunks and retries
+        return JsonResponse({'error': f"Upload incomplete: {len(missing)} chunk(s) missing.", 'missing': missing}, status=400)
+
+    recipient_email = request.POST.get('recipient_email') or None
+    if recipient_email:
+        try:
+            validate_email(recipient_email)
+        except ValidationError:
+            return JsonResponse({'error': "Enter a valid email address."}, status=400)
+
+    # The reservation of the incremental parser if it ran in this worker, else plan the
+    # analysis against the memory budgets; a busy server (503) leaves the upload resumable
+    meta = store.meta(upload_id)
+    try:
+        reservation = chunked_upload.take_reservation(store, upload_id)
+        if reservation is None:
+            reservation = admission.default_controller().admit(chunked_upload.upload_estimate(store, upload_id))
+    except AdmissionRejected as e:
+        metrics.UPLOAD_ERRORS.labels('admission').inc()
+        if e.status != 503:
+            request.session['chunked_uploads'] = [u for u in request.session.get('chunked_uploads', []) if u != upload_id]
+            chunked_upload.discard_upload(store, upload_id)
+        return JsonResponse({'error': str(e)}, status=e.status)
+
+    # From here on the upload is consumed, whether parsing succeeds or not
+    request.session['chunked_uploads'] = [u for u in request.session.get('chunked_uploads', []) if u != upload_id]
+    metrics.UPLOAD_BYTES.labels(meta['file_type']).observe(meta['total_size'])
+    with reservation:
+        total_rows = None
+        try:
+            if reservation.mode == admission.MODE_LOW_MEMORY:
+                try:
+                    df, total_rows = admission.read_csv_sample(store.assemble(upload_id), reservation.estimate, reservation.sample_rows)
+                finally:
+                    chunked_upload.discard_upload(store, upload_id)
+            else:
+                df = chunked_upload.finish_upload(store, upload_id)
+        except Exception as e:
+            metrics.UPLOAD_ERRORS.labels('parse').inc()
+            logging.error(f"File processing error: {e}", exc_info=True)
+            return JsonResponse({'error': f"Error processing file: {e}"}, status=400)
+
+        if df is None or df.empty:
+            metrics.UPLOAD_ERRORS.labels('empty').inc()
+            return JsonResponse({'error': "The uploaded file is empty or could not be read."}, status=400)
+
+        try:
+            context = _analyze_and_store(request, df, recipient_email, reservation=reservation, total_rows=total_rows)
+        except Exception as e:
+            metrics.UPLOAD_ERRORS.labels('processing').inc()
+            logging.error(f"File processing error: {e}", exc_info=True)
+            return JsonResponse({'error': f"Error processing file: {e}"}, status=400)
+
+    request.session['email_sent_message'] = context['email_sent_message']
+    return JsonResponse({'redirect': reverse('analyzer_app:view_results')})
+
+
+def view_results(request):
+    status = collect_job_results(request.session)
+    plots = request.session.get('plots', [])
+    summaries = request.session.get('summaries', {})
+
+    if not plots and not summaries:
+        return redirect('analyzer_app:upload_file')
+
+    return render(request, 'analyzer_app/results.html', {
+        'plots': plots,
+        'summaries': summaries,
+        'analysis_pending': status == 'running',
+        'analysis_error': request.session.get('analysis_error'),
+        'email_sent_message': request.session.pop('email_sent_message', None),
+    })
+
+
+def analysis_status(request):
+    status = collect_job_results(request.session)
+    return JsonResponse({'status': status})
+
+
+@instrument_view('download_plot')
 def download_plot(request, plot_index):
     plots = request.session.get('plots', [])
     
@@ -90,25 +334,24 @@ def download_plot(request, plot_index):
     
     if 0 <= plot_index < len(plots):
         plot = plots[plot_index]
-        image_data = plot['image']
-        
-        # Decode base64 image data
-        import base64
         try:
-            image_bytes = base64.b64decode(image_data)
+            # The image bytes are stored with the artifact, not in the session
+            image_bytes = default_store().load_chart(request.session.get('artifact_id'), plot)
             
             # Create HTTP response with image data
-            response = HttpResponse(image_bytes, content_type='image/png')
+            response = HttpResponse(image_bytes, content_type=plot['content_type'])
+            metrics.DOWNLOAD_BYTES.labels('plot').observe(len(image_bytes))
             filename = plot["title"].replace(" ", "_").replace("/", "_")
-            response['Content-Disposition'] = f'attachment; filename="{filename}.png"'
+            response['Content-Disposition'] = f'attachment; filename="{filename}.{plot["format"]}"'
             return response
         except Exception as e:
-            logging.error(f"Error decoding plot image: {e}")
+            logging.error(f"Error loading plot image: {e}")
             return HttpResponse("Error generating plot download", status=500)
     else:
         return HttpResponse("Plot not found", status=404)
 
 
+@instrument_view('download_summary')
 def download_summary(request, summary_type):
     summaries = request.session.get('summaries', {})
     
@@ -129,31 +372,34 @@ def download_summary(request, summary_type):
             response_content += str(value) + "\n\n"
         
         response = HttpResponse(response_content, content_type='text/plain; charset=utf-8')
+        metrics.DOWNLOAD_BYTES.labels('summary').observe(len(response.content))
         response['Content-Disposition'] = f'attachment; filename="summary_{summary_type}.txt"'
         return response
     else:
         return HttpResponse("Summary not found", status=404)
 
 
+@instrument_view('download_data')
 def download_data(request, data_type):
-    import json
-    
     if data_type == 'original':
-        df_json = request.session.get('original_df')
         filename = 'original_data.csv'
     elif data_type == 'processed':
-        df_json = request.session.get('processed_df')
         filename = 'processed_data.csv'
     else:
         return HttpResponse("Invalid data type", status=400)
     
-    if not df_json:
+    artifact_id = request.session.get('artifact_id')
+    store = default_store()
+    if not artifact_id or not store.exists(artifact_id):
         logging.warning(f"No {data_type} data found in session for download")
         return HttpResponse("No analysis data available. Please upload and analyze a file first.", status=404)
     
     try:
-        # Convert JSON back to DataFrame
-        df = pd.read_json(df_json)
+        # Processed data is rebuilt from the stored original plus the changed columns
+        if data_type == 'original':
+            df = store.load_original(artifact_id)
+        else:
+            df = store.load_processed(artifact_id)
         
         # Convert DataFrame to CSV
         csv_buffer = io.StringIO()
@@ -162,6 +408,7 @@ def download_data(request, data_type):
         
         # Create HTTP response with CSV data
         response = HttpResponse(csv_data, content_type='text/csv; charset=utf-8')
+        metrics.DOWNLOAD_BYTES.labels(f"{data_type}_data").observe(len(response.content))
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
     except Exception as e:
@@ -169,6 +416,7 @@ def download_data(request, data_type):
         return HttpResponse("Error generating data download", status=500)
 
 
+@instrument_view('download_all_plots')
 def download_all_plots(request):
     plots = request.session.get('plots', [])
     
@@ -179,19 +427,33 @@ def download_all_plots(request):
     try:
         # Create a zip file containing all plots
         zip_buffer = io.BytesIO()
+        store = default_store()
+        artifact_id = request.session.get('artifact_id')
         
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
             for i, plot in enumerate(plots):
-                image_data = plot['image']
-                import base64
-                image_bytes = base64.b64decode(image_data)
+                image_bytes = store.load_chart(artifact_id, plot)
                 filename = plot['title'].replace(' ', '_').replace('/', '_')
-                zip_file.writestr(f"{filename}.png", image_bytes)
+                # PNG and WebP are compressed already; deflating them again only costs time
+                compression = zipfile.ZIP_DEFLATED if plot['format'] == 'svg' else zipfile.ZIP_STORED
+                zip_file.writestr(f"{filename}.{plot['format']}", image_bytes, compress_type=compression)
         
         # Create HTTP response with zip data
         response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
+        metrics.DOWNLOAD_BYTES.labels('all_plots').observe(len(response.content))
         response['Content-Disposition'] = 'attachment; filename="all_plots.zip"'
         return response
     except Exception as e:
         logging.error(f"Error creating zip file: {e}")
         return HttpResponse("Error generating plots archive", status=500)
+
+
+def admission_status(request):
+    """Current memory budgets, reservations and queue length of the admission control."""
+    return JsonResponse(admission.default_controller().usage())
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (aggregated across gunicorn workers)."""
+    body, content_type = metrics.render_latest()
+    return HttpResponse(body, content_type=content_type)
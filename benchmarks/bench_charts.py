@@ -0,0 +1,103 @@
+"""
+Compares chart rendering time and size per chart: the previous output (a new pyplot
+figure per chart, default PNG, base64 in the session) against the ChartRenderer formats.
+
+    python -m benchmarks.bench_charts --rows 50000 --cols 10 --repeat 3 --dpi 100
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import statistics
+import time
+from contextlib import contextmanager
+
+import matplotlib.pyplot as plt
+
+from analyzer_app.charts import FORMATS, ChartRenderer
+from analyzer_app.data_analyzer import DataAnalyzer
+from benchmarks.datasets import DATASETS, make_dataset
+
+
+class LegacyRenderer:
+    """The output path before ChartRenderer: pyplot figure per chart, savefig PNG, base64 string."""
+
+    fmt = 'legacy'
+
+    @contextmanager
+    def figure(self, figsize):
+        fig = plt.figure(figsize=figsize)
+        fig.set_layout_engine('tight')
+        try:
+            yield fig
+        finally:
+            plt.close(fig)
+
+    def render(self, fig, title):
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        buf.seek(0)
+        return {'title': title, 'image': base64.b64encode(buf.getvalue()).decode('utf-8')}
+
+
+def raw_size(plot):
+    # Downloads and email attachments decoded the base64 string first
+    image = plot['image']
+    return len(base64.b64decode(image)) if isinstance(image, str) else len(image)
+
+
+def bench(analyzer, renderer, repeat):
+    analyzer.charts = renderer
+    analyzer.generate_visualizations() # warm-up: fonts, pooled figures
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plots = analyzer.generate_visualizations()
+        timings.append(time.perf_counter() - start)
+    formats = {}
+    for plot in plots:
+        fmt = plot.get('format', 'png (base64)')
+        formats[fmt] = formats.get(fmt, 0) + 1
+    return {
+        'charts': len(plots),
+        'formats': formats,
+        'ms_per_chart': statistics.median(timings) / len(plots) * 1000,
+        'raw_bytes_per_chart': sum(raw_size(plot) for plot in plots) / len(plots),
+        # Sent to the browser: base64 inlined in the results page before, the image file now
+        'page_bytes_per_chart': sum(len(plot['image']) for plot in plots) / len(plots),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', nargs='+', default=['mixed', 'numeric'], choices=DATASETS)
+    parser.add_argument('--formats', nargs='+', default=['legacy', *FORMATS], choices=['legacy', *FORMATS])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--cols', type=int, default=10)
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = []
+    for kind in args.datasets:
+        # Charts are drawn from the processed data, as in run_analysis
+        analyzer = DataAnalyzer(df=make_dataset(kind, args.rows, args.cols))
+        analyzer.run_analysis()
+        for fmt in args.formats:
+            renderer = LegacyRenderer() if fmt == 'legacy' else ChartRenderer(fmt, dpi=args.dpi)
+            result = bench(analyzer, renderer, args.repeat)
+            results.append({'dataset': kind, 'format': fmt, 'rows': args.rows, 'cols': args.cols, 'dpi': args.dpi, **result})
+            print(f"{kind:8} {fmt:7} {result['charts']:3} charts  {result['ms_per_chart']:7.1f} ms/chart  "
+                  f"raw {result['raw_bytes_per_chart'] / 1024:7.1f} KiB/chart  "
+                  f"page {result['page_bytes_per_chart'] / 1024:7.1f} KiB/chart  {result['formats']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares the DataAnalyzer engines stage by stage on the synthetic datasets.
+
+    python -m benchmarks.bench_engines --rows 200000 --cols 20 --repeat 3
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from analyzer_app.data_analyzer import DataAnalyzer
+from analyzer_app.engines import ENGINES, pl
+from benchmarks.datasets import DATASETS, make_dataset
+
+STAGES = ('summarize_data', 'handle_missing_values', 'convert_datatypes', 'handle_outliers', 'encode_categoricals')
+
+
+def bench(df, engine, repeat):
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        analyzer = DataAnalyzer(df=df, engine=engine)
+        for stage in STAGES:
+            start = time.perf_counter()
+            getattr(analyzer, stage)()
+            timings[stage].append(time.perf_counter() - start)
+        # Include handing the result back as pandas, as the views do
+        start = time.perf_counter()
+        analyzer.df
+        timings.setdefault('to_pandas', []).append(time.perf_counter() - start)
+    return {stage: statistics.median(values) for stage, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', nargs='+', default=list(DATASETS), choices=DATASETS)
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--cols', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    engines = [name for name in args.engines if name != 'polars' or pl is not None]
+    results = []
+    for kind in args.datasets:
+        df = make_dataset(kind, args.rows, args.cols)
+        for engine in engines:
+            timings = bench(df, engine, args.repeat)
+            results.append({'dataset': kind, 'engine': engine, 'rows': args.rows, 'cols': args.cols, 'seconds': timings})
+            total = sum(timings.values())
+            stages = '  '.join(f"{stage}={seconds:.3f}" for stage, seconds in timings.items())
+            print(f"{kind:8} {engine:7} total={total:.3f}s  {stages}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
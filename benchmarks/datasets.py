@@ -0,0 +1,48 @@
+"""
+Synthetic datasets shaped like typical uploads, shared by the benchmarks.
+"""
+import numpy as np
+import pandas as pd
+
+DATASETS = ('mixed', 'numeric', 'text')
+
+
+def make_dataset(kind='mixed', rows=100_000, cols=20, seed=0):
+    """
+    Returns a DataFrame of the given shape:
+    - 'mixed': numeric with gaps, integers, categories with placeholders,
+      currency/percent strings, dates and an identifier column.
+    - 'numeric': floats with gaps and outliers only.
+    - 'text': mostly low-cardinality string columns.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        if kind == 'numeric':
+            kind_of_col = 0
+        elif kind == 'text':
+            kind_of_col = 2 if i % 5 else 3
+        else:
+            kind_of_col = i % 5
+        name = f"col{i}"
+        if kind_of_col == 0:
+            values = rng.normal(size=rows) * 100
+            values[rng.random(rows) < 0.01] *= 50 # outliers
+            data[name] = np.where(rng.random(rows) < 0.05, np.nan, values)
+        elif kind_of_col == 1:
+            data[name] = rng.integers(0, 1000, rows)
+        elif kind_of_col == 2:
+            data[name] = pd.Series(rng.choice(['north', 'south', 'east', 'west', '?', 'N/A'], rows), dtype=object)
+        elif kind_of_col == 3:
+            data[name] = pd.Series(np.char.add('$', rng.integers(0, 10**6, rows).astype(str)), dtype=object)
+        else:
+            dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 2000, rows), unit='D')
+            data[name] = pd.Series(dates.strftime('%Y-%m-%d'), dtype=object)
+    if kind == 'mixed':
+        data['customer_id'] = pd.Series(np.char.add('C', np.arange(rows).astype(str)), dtype=object)
+    return pd.DataFrame(data)
+
+
+def write_csv(path, kind='mixed', rows=100_000, cols=20, seed=0):
+    make_dataset(kind, rows, cols, seed).to_csv(path, index=False)
+    return path
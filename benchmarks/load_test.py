@@ -0,0 +1,329 @@
+"""
+Local load test for the upload and download endpoints.
+
+For every workers x threads configuration it starts gunicorn on a free local
+port (with a throw-away database, artifact and upload directory), lets
+--concurrency clients each upload a generated CSV to upload_file and then
+fetch download_data/processed and download_all_plots, and reports throughput,
+p50/p95/p99 latency per endpoint and the peak RSS of the workers.
+
+    python -m benchmarks.load_test --configs 1x1 2x1 2x4 4x2 --concurrency 8 --iterations 40
+    python -m benchmarks.load_test --report loadtest_results.jsonl
+
+Each run appends one JSON line per configuration to --output, so results of
+different runs, machines and code versions can be compared with --report.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.datasets import DATASETS, write_csv
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SETTINGS_MODULE = 'loadtest_settings'
+SETTINGS_TEMPLATE = """\
+from data_analyzer_project.settings import *
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+DATABASES['default']['NAME'] = {db!r}
+"""
+
+ENDPOINTS = ('upload_file', 'download_data', 'download_all_plots')
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def worker_rss(master_pid):
+    """RSS in bytes of each child process of the gunicorn master (Linux /proc)."""
+    rss = {}
+    for entry in Path('/proc').iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            status = (entry / 'status').read_text()
+        except OSError:
+            continue
+        fields = dict(line.split(':', 1) for line in status.splitlines() if ':' in line)
+        if int(fields.get('PPid', '0').strip()) == master_pid and 'VmRSS' in fields:
+            rss[int(entry.name)] = int(fields['VmRSS'].split()[0]) * 1024
+    return rss
+
+
+class RSSSampler(threading.Thread):
+    """Polls the workers' RSS and keeps the peaks."""
+
+    def __init__(self, master_pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak_total = 0
+        self.peak_worker = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = worker_rss(self.master_pid)
+            if rss:
+                self.peak_total = max(self.peak_total, sum(rss.values()))
+                self.peak_worker = max(self.peak_worker, max(rss.values()))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Server:
+    """A gunicorn instance serving the app from a temporary state directory."""
+
+    def __init__(self, workers, threads, timeout=300):
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.state = Path(tempfile.mkdtemp(prefix='loadtest_'))
+        self.process = None
+
+    def __enter__(self):
+        (self.state / f'{SETTINGS_MODULE}.py').write_text(SETTINGS_TEMPLATE.format(db=str(self.state / 'db.sqlite3')))
+        env = {
+            **os.environ,
+            'PYTHONPATH': os.pathsep.join([str(self.state), str(ROOT), os.environ.get('PYTHONPATH', '')]),
+            'DJANGO_SETTINGS_MODULE': SETTINGS_MODULE,
+            'ARTIFACT_ROOT': str(self.state / 'artifacts'),
+            'CHUNKED_UPLOAD_ROOT': str(self.state / 'uploads'),
+            'ADMISSION_ROOT': str(self.state / 'admission'),
+            'PROMETHEUS_MULTIPROC_DIR': str(self.state / 'metrics'),
+        }
+        (self.state / 'metrics').mkdir()
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'], cwd=ROOT, env=env, check=True)
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'data_analyzer_project.wsgi',
+             '--bind', f'127.0.0.1:{self.port}', '--workers', str(self.workers), '--threads', str(self.threads),
+             '--timeout', str(self.timeout), '--log-level', 'warning'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=open(self.state / 'gunicorn.log', 'wb'),
+        )
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited; see {self.state / 'gunicorn.log'}")
+            try:
+                urllib.request.urlopen(self.base_url + '/', timeout=10).read()
+                return
+            except OSError:
+                time.sleep(0.25)
+        raise RuntimeError("gunicorn did not become ready in time")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        shutil.rmtree(self.state, ignore_errors=True)
+
+
+class Client:
+    """One simulated user with its own session and CSRF cookies."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        self.opener.open(self.base_url + '/').read()
+        return self._csrf_token()
+
+    def request(self, path, data=None, headers=None):
+        """Returns (ok, seconds, response body)."""
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=600) as response:
+                body = response.read()
+                ok = response.status == 200
+        except urllib.error.HTTPError as e:
+            e.read()
+            return False, time.perf_counter() - start, b''
+        except OSError:
+            return False, time.perf_counter() - start, b''
+        return ok, time.perf_counter() - start, body
+
+    def upload(self, filename, content):
+        token = self._csrf_token()
+        boundary = uuid.uuid4().hex
+        parts = [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file_type"\r\n\r\ncsv\r\n'.encode(),
+            (f'--{boundary}\r\nContent-Disposition: form-data; name="data_file"; filename="{filename}"\r\n'
+             f'Content-Type: text/csv\r\n\r\n').encode(),
+            content,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ]
+        headers = {
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+            'X-CSRFToken': token,
+            'Referer': self.base_url + '/',
+        }
+        ok, seconds, body = self.request('/', data=b''.join(parts), headers=headers)
+        # A failed upload re-renders the upload form (with a 200) instead of the results
+        return ok and b'name="data_file"' not in body, seconds, body
+
+
+def run_config(workers, threads, concurrency, iterations, dataset):
+    """Runs the scenario against one gunicorn configuration and returns its result record."""
+    content = Path(dataset['path']).read_bytes()
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = {endpoint: 0 for endpoint in ENDPOINTS}
+    lock = threading.Lock()
+
+    def record(endpoint, result):
+        ok, seconds, _ = result
+        with lock:
+            latencies[endpoint].append(seconds)
+            if not ok:
+                errors[endpoint] += 1
+
+    def user(iteration_count):
+        client = Client(server.base_url)
+        for _ in range(iteration_count):
+            record('upload_file', client.upload('loadtest.csv', content))
+            record('download_data', client.request('/download_data/processed/'))
+            record('download_all_plots', client.request('/download_all_plots/'))
+
+    with Server(workers, threads) as server:
+        sampler = RSSSampler(server.process.pid)
+        sampler.start()
+        shares = [iterations // concurrency + (1 if i < iterations % concurrency else 0) for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(user, [share for share in shares if share]))
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+
+    total_requests = sum(len(values) for values in latencies.values())
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'config': {'workers': workers, 'threads': threads, 'concurrency': concurrency, 'iterations': iterations},
+        'dataset': {key: value for key, value in dataset.items() if key != 'path'},
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput': {
+            'uploads_per_second': round(len(latencies['upload_file']) / elapsed, 3),
+            'requests_per_second': round(total_requests / elapsed, 3),
+        },
+        'latency_seconds': {
+            endpoint: {
+                'count': len(values),
+                'errors': errors[endpoint],
+                'p50': _round(percentile(values, 50)),
+                'p95': _round(percentile(values, 95)),
+                'p99': _round(percentile(values, 99)),
+            }
+            for endpoint, values in latencies.items()
+        },
+        'worker_rss_bytes': {'peak_total': sampler.peak_total, 'peak_per_worker': sampler.peak_worker},
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+def print_header():
+    header = (f"{'config':>12} {'conc':>4} {'upl/s':>7} {'req/s':>7}  {'upload p50 / p95 / p99 (s)':>26}  "
+              f"{'errors':>6}  {'peak RSS MiB total / worker':>27}")
+    print(header)
+    print('-' * len(header))
+
+
+def print_row(result):
+    config = result['config']
+    upload = result['latency_seconds']['upload_file']
+    errors = sum(stats['errors'] for stats in result['latency_seconds'].values())
+    rss = result['worker_rss_bytes']
+    print(f"{config['workers']:>5}w x {config['threads']:>2}t {config['concurrency']:>4} "
+          f"{result['throughput']['uploads_per_second']:>7.2f} {result['throughput']['requests_per_second']:>7.2f}  "
+          f"{upload['p50']:>7.3f} / {upload['p95']:>7.3f} / {upload['p99']:>7.3f}  {errors:>6}  "
+          f"{rss['peak_total'] / 2**20:>18.0f} / {rss['peak_per_worker'] / 2**20:>6.0f}", flush=True)
+
+
+def parse_config(value):
+    try:
+        workers, threads = value.lower().split('x')
+        return int(workers), int(threads)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WORKERSxTHREADS, e.g. 2x4, got {value!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', nargs='+', type=parse_config, default=[(1, 1), (2, 1), (2, 4), (4, 1)],
+                        help="gunicorn WORKERSxTHREADS configurations (default: 1x1 2x1 2x4 4x1)")
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[4], help="simultaneous clients")
+    parser.add_argument('--iterations', type=int, default=20, help="upload+download rounds per configuration")
+    parser.add_argument('--dataset', default='mixed', choices=DATASETS)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--cols', type=int, default=10)
+    parser.add_argument('--output', default='loadtest_results.jsonl', help="JSON lines file the results are appended to")
+    parser.add_argument('--report', metavar='FILE', help="only print the results stored in FILE")
+    args = parser.parse_args()
+
+    if args.report:
+        print_header()
+        with open(args.report, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    print_row(json.loads(line))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_csv(Path(tmp) / 'dataset.csv', args.dataset, args.rows, args.cols)
+        dataset = {'kind': args.dataset, 'rows': args.rows, 'cols': args.cols, 'bytes': path.stat().st_size, 'path': path}
+        print_header()
+        for workers, threads in args.configs:
+            for concurrency in args.concurrency:
+                result = run_config(workers, threads, concurrency, args.iterations, dataset)
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(result) + '\n')
+                print_row(result)
+    print(f"\nResults appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
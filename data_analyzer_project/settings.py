@@ -138,3 +138,34 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('DJANGO_EMAIL_SENDER')
 EMAIL_HOST_PASSWORD = os.environ.get('DJANGO_EMAIL_APP_PASSWORD')
+
+
+# Progressive analysis: uploads with more rows than the threshold are first analysed
+# on a bounded sample, and the full-data run replaces the results when it finishes
+PROGRESSIVE_ANALYSIS_ROW_THRESHOLD = int(os.environ.get('PROGRESSIVE_ANALYSIS_ROW_THRESHOLD', 100000))
+PROGRESSIVE_SAMPLE_SIZE = int(os.environ.get('PROGRESSIVE_SAMPLE_SIZE', 20000))
+# Background runs are daemon threads that die with their worker process (restart,
+# recycle, crash); a job still running after this many seconds is reported as failed
+PROGRESSIVE_ANALYSIS_MAX_SECONDS = int(os.environ.get('PROGRESSIVE_ANALYSIS_MAX_SECONDS', 1800))
+
+# Uploaded and processed datasets (Parquet, processed stored as a column delta)
+ARTIFACT_ROOT = Path(os.environ.get('ARTIFACT_ROOT', BASE_DIR / 'artifacts'))
+
+# Resumable chunked uploads. Chunks must stay below DATA_UPLOAD_MAX_MEMORY_SIZE
+# (2.5 MB by default), since each one arrives as a plain request body
+CHUNKED_UPLOAD_ROOT = Path(os.environ.get('CHUNKED_UPLOAD_ROOT', BASE_DIR / 'uploads'))
+CHUNKED_UPLOAD_CHUNK_SIZE = 2 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_AGE = 86400  # Unfinished uploads can be resumed for 24 hours
+# The worker parsing an upload as it arrives holds a memory reservation for it; if no
+# chunk arrives for this many seconds (an abandoned or paused upload) the parsed data
+# and the reservation are dropped, and a resumed upload is parsed from disk at the end
+CHUNKED_UPLOAD_PARSER_IDLE_SECONDS = int(os.environ.get('CHUNKED_UPLOAD_PARSER_IDLE_SECONDS', 120))
+
+# Admission control: before parsing, each upload's peak memory is estimated and the
+# analysis is run in full, on a sample, or in low-memory mode to fit these budgets (MiB).
+# Reservations live in ADMISSION_ROOT so all worker processes share the global budget;
+# uploads that do not fit next to running analyses wait up to ADMISSION_QUEUE_TIMEOUT seconds.
+ADMISSION_ROOT = Path(os.environ.get('ADMISSION_ROOT', BASE_DIR / 'admission'))
+ADMISSION_PROCESS_BUDGET_MB = int(os.environ.get('ADMISSION_PROCESS_BUDGET_MB', 2048))
+ADMISSION_GLOBAL_BUDGET_MB = int(os.environ.get('ADMISSION_GLOBAL_BUDGET_MB', 4096))
+ADMISSION_QUEUE_TIMEOUT = int(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30))
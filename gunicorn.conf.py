@@ -0,0 +1,21 @@
+# Gunicorn settings, picked up automatically when gunicorn is started from this
+# directory:  gunicorn data_analyzer_project.wsgi
+import os
+import shutil
+import tempfile
+
+# Workers write their Prometheus samples to files in this directory and the
+# /metrics view aggregates them. It must be set before the app is imported.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'data_analyzer_metrics'))
+
+
+def on_starting(server):
+    # Start from a clean directory so samples of a previous run are not counted again
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
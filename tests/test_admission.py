@@ -0,0 +1,129 @@
+import io
+import pytest
+import pandas as pd
+import numpy as np
+from analyzer_app.admission import (
+    AdmissionController, AdmissionRejected, estimate_upload, plan_cost, read_csv_sample,
+    ESTIMATE_TOLERANCE, MODE_FULL, MODE_DOWNSAMPLE, MODE_LOW_MEMORY, SNIFF_BYTES,
+)
+from analyzer_app.data_analyzer import DataAnalyzer
+
+MIB = 1024 * 1024
+
+@pytest.fixture
+def csv_bytes():
+    rng = np.random.default_rng(3)
+    n = 50_000
+    df = pd.DataFrame({
+        "value": rng.normal(size=n),
+        "count": rng.integers(0, 100, n),
+        "region": rng.choice(["north", "south", "east", "west"], n),
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+@pytest.fixture
+def estimate(csv_bytes):
+    return estimate_upload("csv", len(csv_bytes), csv_bytes[:SNIFF_BYTES])
+
+def controller(tmp_path, process_mb, global_mb=None, **kwargs):
+    return AdmissionController(tmp_path / "admission", process_mb * MIB, (global_mb or process_mb) * MIB, **kwargs)
+
+def test_estimate_upload_sniffs_rows_and_frame_size(csv_bytes, estimate):
+    df = pd.read_csv(io.BytesIO(csv_bytes))
+    actual = df.memory_usage(deep=True, index=False).sum()
+    assert estimate["columns"] == 3
+    assert estimate["rows"] == pytest.approx(len(df), rel=0.05)
+    assert estimate["frame_bytes"] == pytest.approx(actual, rel=0.1)
+    assert estimate["delimiter"] == ","
+
+def test_excel_estimate_uses_file_size():
+    estimate = estimate_upload("excel", 1000, b"PK\x03\x04")
+    assert estimate["rows"] is None
+    assert estimate["frame_bytes"] > 1000
+
+def test_plan_degrades_with_budget(tmp_path, estimate, monkeypatch):
+    # Stream in chunks much smaller than the test file so low-memory mode pays off
+    monkeypatch.setattr("analyzer_app.admission.LOW_MEMORY_CHUNK_ROWS", 5000)
+    full = plan_cost(estimate, MODE_FULL)
+    assert controller(tmp_path, full // MIB + 1).plan(estimate)[0] == MODE_FULL
+
+    parse = plan_cost(estimate, MODE_DOWNSAMPLE, 1000)
+    mode, cost, sample_rows = controller(tmp_path, parse // MIB + 1).plan(estimate)
+    assert mode == MODE_DOWNSAMPLE
+    assert cost < full and 1000 <= sample_rows < estimate["rows"]
+
+    low = plan_cost(estimate, MODE_LOW_MEMORY, 1000)
+    assert low < parse
+    mode, cost, _ = controller(tmp_path, low // MIB + 1).plan(estimate)
+    assert mode == MODE_LOW_MEMORY
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        AdmissionController(tmp_path, low // 2, low // 2).plan(estimate)
+    assert excinfo.value.status == 413
+
+def test_reservations_track_usage_and_release(tmp_path, estimate):
+    admission = controller(tmp_path, 1024)
+    with admission.admit(estimate) as reservation:
+        usage = admission.usage()
+        assert usage["running"] == 1
+        assert usage["process_reserved_bytes"] == usage["global_reserved_bytes"] == reservation.cost
+    assert admission.usage()["global_reserved_bytes"] == 0
+
+def test_admit_queues_until_timeout(tmp_path, estimate):
+    cost = plan_cost(estimate, MODE_FULL)
+    admission = AdmissionController(tmp_path, cost, cost, queue_timeout=0.3, poll_interval=0.05)
+    with admission.admit(estimate):
+        assert admission.admit(estimate, wait=False) is None
+        with pytest.raises(AdmissionRejected) as excinfo:
+            admission.admit(estimate)
+        assert excinfo.value.status == 503
+    assert admission.usage()["queued"] == 0
+    admission.admit(estimate).release()
+
+def test_frame_allowance_inverts_plan_cost(tmp_path, estimate):
+    with controller(tmp_path, 1024).admit(estimate) as reservation:
+        assert reservation.mode == MODE_FULL
+        assert reservation.frame_allowance() == pytest.approx(estimate["frame_bytes"] * ESTIMATE_TOLERANCE, abs=2)
+
+def test_transferred_reservation_is_released_by_new_owner(tmp_path, estimate):
+    admission = controller(tmp_path, 1024)
+    reservation = admission.admit(estimate)
+    background = reservation.transfer()
+    reservation.release()
+    assert admission.usage()["running"] == 1
+    background.release()
+    assert admission.usage()["running"] == 0
+
+def test_reservations_of_dead_processes_are_ignored(tmp_path, estimate):
+    admission = controller(tmp_path, 1024)
+    admission.root.mkdir(parents=True)
+    (admission.root / f"res_999999999_{'a' * 32}").write_text(str(10 * MIB))
+    assert admission.usage()["global_reserved_bytes"] == 0
+
+def test_read_csv_sample(csv_bytes, estimate):
+    sample, total_rows = read_csv_sample(io.BytesIO(csv_bytes), estimate, 2000)
+    assert total_rows == 50_000
+    assert 1500 < len(sample) <= 2000
+    full = pd.read_csv(io.BytesIO(csv_bytes))
+    pd.testing.assert_frame_equal(sample, full.loc[sample.index])
+
+def test_run_analysis_marks_presampled_data_approximate(csv_bytes, estimate):
+    sample, total_rows = read_csv_sample(io.BytesIO(csv_bytes), estimate, 2000)
+    _, summaries = DataAnalyzer(df=sample).run_analysis(total_rows=total_rows)
+    assert summaries["sampling"]["total_rows"] == 50_000
+    assert summaries["sampling"]["sample_rows"] == len(sample)
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_read_csv_sample_decodes_late_non_ascii_text(encoding):
+    # The sniffed head is plain ASCII; the only accented row comes last
+    text = "id,name\n" + "".join(f"{i},plain{i}\n" for i in range(20_000)) + "20000,Zoë Müller\n"
+    data = text.encode(encoding)
+    estimate = estimate_upload("csv", len(data), data[:SNIFF_BYTES])
+    assert estimate["encoding"] == "utf-8"
+    sample, total_rows = read_csv_sample(io.BytesIO(data), estimate, 30_000)
+    assert total_rows == 20_001
+    if encoding == "utf-8":
+        assert sample["name"].iloc[-1] == "Zoë Müller"
+    else:
+        # Re-detected over the whole file; chardet may pick another single-byte code page
+        assert sample["name"].iloc[-1].startswith("Zo")
@@ -0,0 +1,77 @@
+import os
+import time
+import pytest
+import pandas as pd
+import numpy as np
+from analyzer_app.artifacts import ArtifactStore
+from analyzer_app.data_analyzer import DataAnalyzer
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(tmp_path / "artifacts")
+
+@pytest.fixture
+def uploaded_df():
+    rng = np.random.default_rng(3)
+    n = 500
+    return pd.DataFrame({
+        "id": np.arange(n),
+        "value": rng.standard_t(3, n),
+        "score": rng.uniform(0, 1, n),
+        "segment": pd.Series(rng.choice(["A", "B", None], n), dtype=object),
+        "mixed": pd.Series([1, "two", 3.0, None, "five"] * 100, dtype=object),
+    })
+
+def test_original_round_trip(store, uploaded_df):
+    artifact_id = store.save_original(uploaded_df)
+    assert store.exists(artifact_id)
+    loaded = store.load_original(artifact_id)
+    assert list(loaded.columns) == list(uploaded_df.columns)
+    pd.testing.assert_series_equal(loaded["value"], uploaded_df["value"])
+
+def test_processed_stored_as_delta(store, uploaded_df):
+    artifact_id = store.save_original(uploaded_df)
+    analyzer = DataAnalyzer(df=uploaded_df)
+    analyzer.handle_missing_values()
+    analyzer.handle_outliers()
+    manifest = store.save_processed(artifact_id, uploaded_df, analyzer.df)
+
+    assert manifest["mode"] == "delta"
+    assert "value" in manifest["changed"]
+    assert "score" not in manifest["changed"]
+    loaded = store.load_processed(artifact_id)
+    assert list(loaded.columns) == list(analyzer.df.columns)
+    pd.testing.assert_series_equal(loaded["value"], analyzer.df["value"])
+    pd.testing.assert_series_equal(loaded["score"], analyzer.df["score"])
+
+def test_processed_column_selection(store, uploaded_df):
+    artifact_id = store.save_original(uploaded_df)
+    processed = uploaded_df.assign(value=uploaded_df["value"].clip(-1, 1))
+    store.save_processed(artifact_id, uploaded_df, processed)
+    loaded = store.load_processed(artifact_id, columns=["score", "value"])
+    assert list(loaded.columns) == ["value", "score"]
+
+def test_processed_with_different_rows_stored_in_full(store, uploaded_df):
+    artifact_id = store.save_original(uploaded_df)
+    sample = uploaded_df.iloc[::10]
+    manifest = store.save_processed(artifact_id, uploaded_df, sample)
+    assert manifest["mode"] == "full"
+    assert len(store.load_processed(artifact_id)) == len(sample)
+
+def test_invalid_artifact_id_rejected(store):
+    with pytest.raises(ValueError):
+        store.load_original("../etc")
+
+def test_purge_keeps_artifacts_still_in_use(store, uploaded_df):
+    old_in_use, old_unused, recent = (store.save_original(uploaded_df) for _ in range(3))
+    # in_use is only consulted when something has expired
+    store.purge_expired(3600, in_use=lambda: pytest.fail("called without expired artifacts"))
+
+    for artifact_id in (old_in_use, old_unused):
+        os.utime(store.root / artifact_id, (time.time() - 7200,) * 2)
+    store.purge_expired(3600, in_use=lambda: {old_in_use})
+    assert store.exists(old_in_use) and store.exists(recent)
+    assert not store.exists(old_unused)
+
+    store.delete(recent)
+    assert not store.exists(recent)
@@ -0,0 +1,83 @@
+import io
+import pytest
+import pandas as pd
+import numpy as np
+from PIL import Image
+from analyzer_app.artifacts import ArtifactStore
+from analyzer_app.charts import ChartRenderer, FORMATS, get_renderer
+from analyzer_app.data_analyzer import DataAnalyzer
+
+SIGNATURES = {"png": b"\x89PNG", "webp": b"RIFF", "svg": b"<?xml"}
+
+def simple_chart(renderer, title="Simple"):
+    with renderer.figure((6, 4)) as fig:
+        ax = fig.subplots()
+        ax.bar(["a", "b", "c"], [3, 1, 2])
+        ax.set_title(title)
+        return renderer.render(fig, title)
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_render_formats(fmt):
+    chart = simple_chart(ChartRenderer(fmt))
+    assert isinstance(chart["image"], bytes)
+    assert chart["image"].startswith(SIGNATURES[fmt])
+    assert chart["format"] == fmt
+    assert chart["content_type"] == FORMATS[fmt]
+
+def test_dense_charts_fall_back_from_svg_to_png():
+    renderer = ChartRenderer("svg")
+    rng = np.random.default_rng(0)
+    with renderer.figure((6, 4)) as fig:
+        ax = fig.subplots()
+        ax.scatter(rng.normal(size=2000), rng.normal(size=2000))
+        chart = renderer.render(fig, "Dense")
+    assert chart["format"] == "png"
+    assert chart["image"].startswith(SIGNATURES["png"])
+
+def test_dpi_sets_pixel_size_and_palette_png():
+    chart = simple_chart(ChartRenderer("png", dpi=50))
+    image = Image.open(io.BytesIO(chart["image"]))
+    assert image.size == (300, 200)
+    assert image.mode == "P"
+    truecolour = Image.open(io.BytesIO(simple_chart(ChartRenderer("png", dpi=50, png_colors=0))["image"]))
+    assert truecolour.mode == "RGB"
+
+def test_figures_are_reused_and_cleared():
+    renderer = ChartRenderer("png")
+    with renderer.figure((6, 4)) as first:
+        first.subplots()
+    with renderer.figure((6, 4)) as second:
+        assert second is first
+        assert second.axes == []
+        # A nested request for the same size gets its own figure
+        with renderer.figure((6, 4)) as nested:
+            assert nested is not second
+    # Repeated renders on a reused figure give identical output
+    assert simple_chart(renderer)["image"] == simple_chart(renderer)["image"]
+
+def test_get_renderer_defaults_and_validation(monkeypatch):
+    monkeypatch.setenv("CHART_FORMAT", "webp")
+    monkeypatch.setenv("CHART_DPI", "72")
+    renderer = get_renderer()
+    assert (renderer.fmt, renderer.dpi) == ("webp", 72)
+    assert get_renderer() is renderer
+    with pytest.raises(ValueError):
+        get_renderer("gif")
+
+def test_analyzer_charts_are_raw_bytes_in_the_configured_format():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"x": rng.normal(size=300), "y": rng.normal(size=300), "g": rng.choice(["a", "b"], 300)})
+    plots = DataAnalyzer(df=df, chart_format="webp", chart_dpi=60).generate_visualizations()
+    assert plots
+    assert all(plot["format"] == "webp" and plot["image"].startswith(b"RIFF") for plot in plots)
+
+def test_store_saves_charts_by_content(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts")
+    artifact_id = store.save_original(pd.DataFrame({"x": [1, 2, 3]}))
+    chart = simple_chart(ChartRenderer("png"))
+    stored = store.save_charts(artifact_id, [chart, dict(chart, title="Copy")])
+    assert all("image" not in plot for plot in stored)
+    assert stored[0]["file"] == stored[1]["file"]
+    assert store.load_chart(artifact_id, stored[1]) == chart["image"]
+    with pytest.raises(ValueError):
+        store.load_chart(artifact_id, {"file": "../original.parquet"})
@@ -0,0 +1,207 @@
+import hashlib
+import io
+import os
+import time
+import pytest
+import pandas as pd
+import numpy as np
+from analyzer_app.admission import AdmissionController, SNIFF_BYTES, estimate_upload
+from analyzer_app.chunked_upload import (
+    ChunkedUploadStore, ChunkedUploadError, IncrementalCSVParser, chunk_received, discard_upload,
+    finish_upload, purge_idle_parsers, take_reservation, _parsers,
+)
+
+CHUNK_SIZE = 1024
+MIB = 1024 * 1024
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(tmp_path / "uploads")
+
+@pytest.fixture
+def controller(tmp_path):
+    return AdmissionController(tmp_path / "admission", 1024 * MIB, 1024 * MIB)
+
+@pytest.fixture
+def csv_bytes():
+    rng = np.random.default_rng(5)
+    n = 400
+    df = pd.DataFrame({
+        "id": np.arange(n),
+        "value": rng.normal(size=n).round(4),
+        "label": rng.choice(["plain", "with, comma", "multi\nline"], n),
+    })
+    return df.to_csv(index=False).encode("utf-8")
+
+def _chunks(data, size=CHUNK_SIZE):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def _upload(store, controller, data, estimate=None):
+    meta = store.start("data.csv", "csv", len(data), CHUNK_SIZE, estimate=estimate)
+    for index, chunk in enumerate(_chunks(data)):
+        store.save_chunk(meta["upload_id"], index, chunk, hashlib.sha256(chunk).hexdigest())
+        chunk_received(store, meta["upload_id"], index, controller)
+    return meta["upload_id"]
+
+def test_incremental_parser_matches_full_parse(csv_bytes):
+    parser = IncrementalCSVParser()
+    for chunk in _chunks(csv_bytes):
+        parser.feed(chunk)
+    df = parser.finish()
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(csv_bytes)))
+    assert parser.delimiter == ","
+
+def test_incremental_parser_sniffs_semicolon():
+    parser = IncrementalCSVParser()
+    parser.feed(b"a;b\n1;x\n2;y\n")
+    df = parser.finish()
+    assert list(df.columns) == ["a", "b"]
+    assert parser.delimiter == ";"
+
+def test_incremental_parser_falls_back_on_dtype_conflict():
+    data = b"col\n" + b"1\n" * 300 + b"text\n"
+    parser = IncrementalCSVParser()
+    for chunk in _chunks(data, 64):
+        parser.feed(chunk)
+    assert parser.finish() is None
+
+def test_save_chunk_rejects_bad_checksum(store, csv_bytes):
+    meta = store.start("data.csv", "csv", len(csv_bytes), CHUNK_SIZE)
+    with pytest.raises(ChunkedUploadError, match="Checksum"):
+        store.save_chunk(meta["upload_id"], 0, csv_bytes[:CHUNK_SIZE], "0" * 64)
+    assert store.received(meta["upload_id"]) == []
+
+def test_out_of_order_chunks_and_resume(store, csv_bytes):
+    meta = store.start("data.csv", "csv", len(csv_bytes), CHUNK_SIZE)
+    chunks = _chunks(csv_bytes)
+    for index in reversed(range(1, len(chunks))):
+        store.save_chunk(meta["upload_id"], index, chunks[index], hashlib.sha256(chunks[index]).hexdigest())
+    assert store.missing(meta["upload_id"]) == [0]
+    with pytest.raises(ChunkedUploadError, match="missing"):
+        finish_upload(store, meta["upload_id"])
+
+    store.save_chunk(meta["upload_id"], 0, chunks[0], hashlib.sha256(chunks[0]).hexdigest())
+    df = finish_upload(store, meta["upload_id"])
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(csv_bytes)))
+
+def test_finish_upload_falls_back_to_full_parse(store, controller):
+    data = b"col\n" + b"1\n" * 1000 + b"text\n"
+    upload_id = _upload(store, controller, data)
+    df = finish_upload(store, upload_id)
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(data)))
+    with pytest.raises(ChunkedUploadError):
+        store.meta(upload_id)
+
+def test_only_the_owner_parses_incrementally(store, controller, csv_bytes):
+    upload_id = _upload(store, controller, csv_bytes)
+    assert store.owner(upload_id) == os.getpid()
+    assert upload_id in _parsers
+
+    # Another worker took chunk 0: this process keeps no parsed copy
+    meta = store.start("data.csv", "csv", len(csv_bytes), CHUNK_SIZE)
+    other = meta["upload_id"]
+    (store.root / other / "owner").write_text(str(os.getpid() + 1))
+    for index, chunk in enumerate(_chunks(csv_bytes)):
+        store.save_chunk(other, index, chunk, hashlib.sha256(chunk).hexdigest())
+        assert chunk_received(store, other, index, controller) is None
+    assert other not in _parsers
+    pd.testing.assert_frame_equal(finish_upload(store, other), pd.read_csv(io.BytesIO(csv_bytes)))
+    discard_upload(store, upload_id)
+
+def test_parsers_of_uploads_finished_elsewhere_are_purged(store, controller, csv_bytes):
+    upload_id = _upload(store, controller, csv_bytes)
+    assert upload_id in _parsers
+    # Completed or discarded by another worker: only the files disappear
+    store.discard(upload_id)
+    purge_idle_parsers(store)
+    assert upload_id not in _parsers
+    assert controller.usage()["running"] == 0
+
+def test_incremental_parser_holds_the_uploads_reservation(store, controller, csv_bytes):
+    estimate = estimate_upload("csv", len(csv_bytes), csv_bytes[:SNIFF_BYTES])
+    upload_id = _upload(store, controller, csv_bytes, estimate)
+    assert controller.usage()["running"] == 1
+    # The completing request takes the reservation over
+    with take_reservation(store, upload_id) as reservation:
+        assert reservation.mode == "full"
+        assert reservation.estimate == estimate
+        pd.testing.assert_frame_equal(finish_upload(store, upload_id), pd.read_csv(io.BytesIO(csv_bytes)))
+        assert controller.usage()["running"] == 1
+    assert controller.usage()["running"] == 0
+
+def test_batches_beyond_the_reservation_are_dropped(store, controller, csv_bytes):
+    # Estimated as if the file were just its first tenth
+    head = csv_bytes[:len(csv_bytes) // 10]
+    estimate = estimate_upload("csv", len(head), head)
+    upload_id = _upload(store, controller, csv_bytes, estimate)
+    assert _parsers[upload_id].fallback_reason.startswith("parsed data exceeded")
+    assert controller.usage()["running"] == 0
+    assert take_reservation(store, upload_id) is None
+    pd.testing.assert_frame_equal(finish_upload(store, upload_id), pd.read_csv(io.BytesIO(csv_bytes)))
+
+def test_low_memory_uploads_are_not_parsed_incrementally(store, csv_bytes):
+    # Too large to parse in full within the budget, so only a sampled read at completion fits
+    estimate = estimate_upload("csv", 10 * 1024 * MIB, csv_bytes[:SNIFF_BYTES])
+    controller = AdmissionController(store.root.parent / "admission", 256 * MIB, 256 * MIB)
+    assert controller.plan(estimate)[0] == "low_memory"
+    upload_id = _upload(store, controller, csv_bytes, estimate)
+    assert store.owner(upload_id) == os.getpid()
+    assert upload_id not in _parsers
+    assert controller.usage()["running"] == 0
+    discard_upload(store, upload_id)
+
+def test_completing_elsewhere_disowns_the_parser(store, controller, csv_bytes):
+    # This worker completes an upload whose owner is another one: it disowns it
+    meta = store.start("data.csv", "csv", len(csv_bytes), CHUNK_SIZE)
+    (store.root / meta["upload_id"] / "owner").write_text(str(os.getpid() + 1))
+    assert take_reservation(store, meta["upload_id"]) is None
+    assert store.owner(meta["upload_id"]) is None
+
+    # ... and the owner drops its parser and reservation
+    upload_id = _upload(store, controller, csv_bytes)
+    assert controller.usage()["running"] == 1
+    store.disown(upload_id)
+    purge_idle_parsers(store)
+    assert upload_id not in _parsers
+    assert controller.usage()["running"] == 0
+
+def test_idle_parsers_release_their_reservation(store, controller, csv_bytes):
+    meta = store.start("data.csv", "csv", len(csv_bytes), CHUNK_SIZE)
+    upload_id = meta["upload_id"]
+    chunks = _chunks(csv_bytes)
+    for index in range(3):
+        store.save_chunk(upload_id, index, chunks[index], hashlib.sha256(chunks[index]).hexdigest())
+        chunk_received(store, upload_id, index, controller)
+    assert controller.usage()["running"] == 1
+
+    # The owner saw no chunk lately, but another worker just stored one: still active
+    _parsers[upload_id].last_activity -= store.parser_idle_seconds + 1
+    purge_idle_parsers(store)
+    assert upload_id in _parsers
+
+    # No chunk anywhere for the idle window: the upload was abandoned
+    past = time.time() - store.parser_idle_seconds - 1
+    os.utime(store.root / upload_id, (past, past))
+    purge_idle_parsers(store)
+    assert upload_id not in _parsers
+    assert controller.usage()["running"] == 0
+
+    # Resuming it later still yields the data, parsed from disk
+    for index in range(3, len(chunks)):
+        store.save_chunk(upload_id, index, chunks[index], hashlib.sha256(chunks[index]).hexdigest())
+        assert chunk_received(store, upload_id, index, controller) is None
+    pd.testing.assert_frame_equal(finish_upload(store, upload_id), pd.read_csv(io.BytesIO(csv_bytes)))
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_late_non_ascii_text_is_decoded(store, controller, encoding):
+    # The first chunk is plain ASCII; the only accented row comes last, beyond
+    # the bytes chardet looks at by default
+    text = "id,name\n" + "".join(f"{i},plain{i}\n" for i in range(20_000)) + "20000,Zoë Müller\n"
+    data = text.encode(encoding)
+    df = finish_upload(store, _upload(store, controller, data))
+    assert len(df) == 20_001
+    if encoding == "utf-8":
+        assert df["name"].iloc[-1] == "Zoë Müller"
+    else:
+        # Re-detected over the whole file; chardet may pick another single-byte code page
+        assert df["name"].iloc[-1].startswith("Zo")
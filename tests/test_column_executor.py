@@ -0,0 +1,40 @@
+import pytest
+import pandas as pd
+import numpy as np
+from analyzer_app.column_executor import map_columns
+from analyzer_app.data_analyzer import DataAnalyzer
+
+@pytest.fixture
+def wide_df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({f"col{i}": rng.normal(size=100) for i in range(40)})
+
+def test_map_columns_parallel_matches_serial(wide_df):
+    serial = map_columns(wide_df, lambda s: s * 2, max_workers=1)
+    parallel = map_columns(wide_df, lambda s: s * 2, max_workers=4)
+    pd.testing.assert_frame_equal(serial, parallel)
+    pd.testing.assert_frame_equal(parallel, wide_df * 2)
+
+def test_map_columns_drops_and_passes_through(wide_df):
+    result = map_columns(wide_df, lambda s: None if s.name == "col3" else s + 1, columns=["col1", "col3"], max_workers=4)
+    assert "col3" not in result.columns
+    assert list(result.columns) == [c for c in wide_df.columns if c != "col3"]
+    pd.testing.assert_series_equal(result["col1"], wide_df["col1"] + 1)
+    pd.testing.assert_series_equal(result["col2"], wide_df["col2"])
+
+def test_map_columns_does_not_modify_input(wide_df):
+    before = wide_df.copy()
+    map_columns(wide_df, lambda s: s.clip(-1, 1), max_workers=4)
+    pd.testing.assert_frame_equal(wide_df, before)
+
+def test_cleaning_stages_parallel_matches_serial(wide_df):
+    df = wide_df.copy()
+    df.iloc[::7, ::3] = np.nan
+    results = []
+    for n_jobs in (1, 4):
+        analyzer = DataAnalyzer(df=df.copy(), n_jobs=n_jobs)
+        analyzer.handle_missing_values()
+        analyzer.convert_datatypes()
+        analyzer.handle_outliers()
+        results.append(analyzer.df)
+    pd.testing.assert_frame_equal(results[0], results[1])
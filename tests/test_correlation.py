@@ -0,0 +1,54 @@
+import pytest
+import pandas as pd
+import numpy as np
+from analyzer_app.correlation import CorrelationAccumulator, correlation_matrix, top_pairs
+from analyzer_app.data_analyzer import DataAnalyzer
+
+@pytest.fixture
+def numeric_df():
+    rng = np.random.default_rng(7)
+    n = 3000
+    df = pd.DataFrame(rng.normal(size=(n, 6)), columns=[f"c{i}" for i in range(6)])
+    df["linear"] = df["c0"] * 2 + rng.normal(size=n) * 0.1 + 1e6 # large offset
+    df["monotonic"] = np.exp(df["c1"])
+    return df
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_matches_pandas(numeric_df, method):
+    result = correlation_matrix(numeric_df, method)
+    pd.testing.assert_frame_equal(result, numeric_df.corr(method), atol=1e-10, check_exact=False)
+
+def test_chunked_accumulation_matches_single_pass(numeric_df):
+    single = correlation_matrix(numeric_df, chunk_rows=len(numeric_df))
+    chunked = correlation_matrix(numeric_df, chunk_rows=128)
+    pd.testing.assert_frame_equal(chunked, single, atol=1e-12, check_exact=False)
+
+def test_pairwise_complete_pearson_with_missing_and_constant(numeric_df):
+    df = numeric_df.copy()
+    df.iloc[::7, 2] = np.nan
+    df.iloc[::5, 3] = np.nan
+    df["constant"] = 1.0
+    df["empty"] = np.nan
+    result = correlation_matrix(df, chunk_rows=500)
+    expected = df.corr()
+    pd.testing.assert_frame_equal(result, expected, atol=1e-10, check_exact=False)
+
+def test_accumulator_needs_two_rows():
+    accumulator = CorrelationAccumulator(2)
+    accumulator.update(np.array([[1.0, 2.0]]))
+    assert np.isnan(accumulator.result()).all()
+
+def test_top_pairs(numeric_df):
+    corr = correlation_matrix(numeric_df, "spearman")
+    pairs = top_pairs(corr, n=2)
+    assert {frozenset(pair[:2]) for pair in pairs} == {frozenset(("c0", "linear")), frozenset(("c1", "monotonic"))}
+    assert all(abs(pair[2]) > 0.99 for pair in pairs)
+
+def test_visualizations_use_most_correlated_pairs(numeric_df):
+    analyzer = DataAnalyzer(df=numeric_df)
+    table = analyzer.analyze_correlations(max_pairs=2)
+    assert "linear" in table and "monotonic" in table
+    titles = [plot["title"] for plot in analyzer.generate_visualizations()]
+    assert "Correlation Heatmap" in titles
+    assert "C1 vs Monotonic" in titles
+    assert not any("Pair Plot" in title for title in titles)
@@ -2,7 +2,7 @@ import pytest
 import pandas as pd
 import numpy as np
 import os
-from analyzer_app.data_analyzer import DataAnalyzer
+from analyzer_app.data_analyzer import DataAnalyzer, sample_rows, sample_margin_of_error
 
 # Fixtures for test files
 @pytest.fixture
@@ -123,3 +123,84 @@ def test_generate_visualizations_empty_columns(df_for_plotting):
     # So, it should return 0 plots.
     assert len(plots) == 0
 
+# Test cases for sample-first analysis
+@pytest.fixture
+def large_df():
+    rng = np.random.default_rng(42)
+    n = 5000
+    return pd.DataFrame({
+        "value": rng.normal(100, 15, n),
+        "segment": rng.choice(["A", "B", "C"], size=n, p=[0.7, 0.2, 0.1]),
+    })
+
+def test_sample_rows_uniform(large_df):
+    sample = sample_rows(large_df, 500)
+    assert len(sample) == 500
+    assert sample.index.is_unique
+    assert sample.index.isin(large_df.index).all()
+
+def test_sample_rows_small_df_unchanged(df_for_plotting):
+    assert sample_rows(df_for_plotting, 100) is df_for_plotting
+
+def test_sample_rows_stratified_keeps_proportions(large_df):
+    sample = sample_rows(large_df, 1000, stratify_by="segment")
+    expected = large_df["segment"].value_counts(normalize=True)
+    observed = sample["segment"].value_counts(normalize=True)
+    assert abs(len(sample) - 1000) <= 3
+    assert np.allclose(observed[expected.index], expected, atol=0.005)
+
+def test_sample_margin_of_error():
+    assert sample_margin_of_error(1000, 1000) == 0.0
+    assert sample_margin_of_error(1000, 1_000_000) == pytest.approx(0.031, abs=0.001)
+
+def test_run_analysis_with_sample_marks_results_approximate(large_df):
+    analyzer = DataAnalyzer(df=large_df.copy())
+    plots, summaries = analyzer.run_analysis(sample_size=1000)
+    assert len(analyzer.df) <= 1003
+    sampling = summaries["sampling"]
+    assert sampling["approximate"] is True
+    assert sampling["total_rows"] == 5000
+    assert sampling["sample_rows"] == len(analyzer.df)
+    assert "95% confidence" in summaries["final"]["sampling"]
+    assert plots and all(p["approximate"] for p in plots)
+
+def test_run_analysis_without_sample_is_exact(df_for_plotting):
+    analyzer = DataAnalyzer(df=df_for_plotting.copy())
+    plots, summaries = analyzer.run_analysis(sample_size=100)
+    assert "sampling" not in summaries
+    assert not any(p.get("approximate") for p in plots)
+
+# Test cases for copy-minimizing pipeline and memory accounting
+@pytest.fixture
+def large_numeric_df():
+    rng = np.random.default_rng(7)
+    n = 200_000
+    df = pd.DataFrame({f"heavy_{i}": rng.standard_t(3, n) for i in range(6)})
+    df["uniform"] = rng.uniform(0, 1, n)
+    return df
+
+def test_run_analysis_does_not_modify_input(df_with_missing_values):
+    original = df_with_missing_values.copy()
+    DataAnalyzer(df=df_with_missing_values).run_analysis()
+    pd.testing.assert_frame_equal(df_with_missing_values, original)
+
+def test_unchanged_columns_share_memory(large_numeric_df):
+    analyzer = DataAnalyzer(df=large_numeric_df)
+    analyzer.handle_missing_values()
+    analyzer.convert_datatypes()
+    analyzer.handle_outliers()
+    assert np.shares_memory(analyzer.df["uniform"].to_numpy(), large_numeric_df["uniform"].to_numpy())
+    assert not np.shares_memory(analyzer.df["heavy_0"].to_numpy(), large_numeric_df["heavy_0"].to_numpy())
+
+def test_stage_peak_memory_tracking(large_numeric_df, monkeypatch):
+    monkeypatch.setattr(DataAnalyzer, "generate_visualizations", lambda self: [])
+    analyzer = DataAnalyzer(df=large_numeric_df, track_memory=True)
+    analyzer.run_analysis()
+    dataset_bytes = large_numeric_df.memory_usage(deep=True).sum()
+    stats = analyzer.stage_stats
+    assert set(stats) >= {"handle_missing_values", "convert_datatypes", "handle_outliers", "encode_categoricals"}
+    assert all(s["seconds"] >= 0 for s in stats.values())
+    # Cleaning stages allocate at most the changed columns, never a full copy per stage
+    assert stats["handle_missing_values"]["peak_bytes"] < 0.25 * dataset_bytes
+    assert stats["convert_datatypes"]["peak_bytes"] < 0.5 * dataset_bytes
+    assert stats["handle_outliers"]["peak_bytes"] < 1.25 * dataset_bytes
@@ -0,0 +1,91 @@
+import pytest
+import pandas as pd
+import numpy as np
+from analyzer_app.data_analyzer import DataAnalyzer
+from analyzer_app.engines import get_engine, PandasEngine
+
+pl = pytest.importorskip("polars")
+
+@pytest.fixture
+def mixed_df():
+    rng = np.random.default_rng(1)
+    n = 500
+    return pd.DataFrame({
+        "num": np.where(rng.random(n) < 0.1, np.nan, rng.normal(size=n) * 100),
+        "count": rng.integers(0, 50, n),
+        "category": pd.Series(rng.choice(["a", "b", "c", "?", ""], n), dtype=object),
+        "price": pd.Series([f"${x:,}" for x in rng.integers(0, 10**6, n)], dtype=object),
+        "percent": pd.Series([f"{x}%" for x in rng.integers(0, 100, n)], dtype=object),
+        "when": pd.Series(pd.date_range("2020-01-01", periods=n).strftime("%Y-%m-%d"), dtype=object),
+        "customer_id": pd.Series([f"C{i}" for i in range(n)], dtype=object),
+        "sparse": np.where(rng.random(n) < 0.9, np.nan, 1.0),
+    })
+
+def run_stages(df, engine):
+    analyzer = DataAnalyzer(df=df.copy(), engine=engine)
+    analyzer.handle_missing_values()
+    analyzer.convert_datatypes()
+    analyzer.handle_outliers()
+    analyzer.encode_categoricals()
+    return analyzer
+
+def test_get_engine():
+    assert isinstance(get_engine("pandas"), PandasEngine)
+    assert get_engine("polars").name == "polars"
+    assert get_engine("auto").name == "polars"
+    with pytest.raises(ValueError):
+        get_engine("spark")
+
+def test_get_engine_from_environment(monkeypatch):
+    monkeypatch.setenv("ANALYZER_ENGINE", "polars")
+    assert DataAnalyzer(df=pd.DataFrame({"a": [1]})).engine.name == "polars"
+
+def test_pipeline_parity(mixed_df):
+    expected = run_stages(mixed_df, "pandas").df
+    result = run_stages(mixed_df, "polars").df
+    assert list(result.columns) == list(expected.columns)
+    assert "sparse" not in result.columns
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert result.index.equals(mixed_df.index)
+
+def test_stage_parity(mixed_df):
+    pandas_analyzer = DataAnalyzer(df=mixed_df.copy(), engine="pandas")
+    polars_analyzer = DataAnalyzer(df=mixed_df.copy(), engine="polars")
+    for stage in ("handle_missing_values", "convert_datatypes", "handle_outliers", "encode_categoricals"):
+        getattr(pandas_analyzer, stage)()
+        getattr(polars_analyzer, stage)()
+        pd.testing.assert_frame_equal(polars_analyzer.df, pandas_analyzer.df, check_dtype=False, obj=stage)
+
+def test_summary_parity(mixed_df):
+    pandas_engine, polars_engine = get_engine("pandas"), get_engine("polars")
+    df = run_stages(mixed_df, "pandas").df.drop(columns=["when"])
+    frame = polars_engine.from_pandas(df)
+    pd.testing.assert_series_equal(polars_engine.missing_counts(frame), pandas_engine.missing_counts(df))
+    pd.testing.assert_frame_equal(polars_engine.describe(frame), pandas_engine.describe(df))
+    expected = pandas_engine.value_counts(df, "category")
+    result = polars_engine.value_counts(frame, "category")
+    assert result.to_dict() == expected.to_dict()
+
+def test_polars_run_analysis_keeps_non_default_index(mixed_df):
+    df = mixed_df.iloc[::2]
+    analyzer = DataAnalyzer(df=df, engine="polars")
+    plots, summaries = analyzer.run_analysis()
+    assert analyzer.df.index.equals(df.index)
+    assert plots
+    assert "descriptive_statistics" in summaries["final"]
+
+def test_polars_accepts_mixed_object_columns():
+    # pd.read_csv leaves ints and strings in one object column when a large file's
+    # column only turns textual after its first chunks
+    n = 1000
+    df = pd.DataFrame({
+        "code": pd.Series(list(range(n // 2)) + [f"A{i}" for i in range(n // 2)], dtype=object),
+        "flag": pd.Series([True, 1, None, "x"] * (n // 4), dtype=object),
+        "value": np.arange(n, dtype=float),
+    })
+    frame = get_engine("polars").from_pandas(df)
+    assert frame["code"].dtype == pl.String
+    assert frame["code"].to_list()[:2] == ["0", "1"]
+    assert frame["flag"].null_count() == n // 4
+    analyzer = run_stages(df, "polars")
+    assert len(analyzer.df) == n
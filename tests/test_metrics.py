@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import pandas as pd
+import numpy as np
+from prometheus_client import REGISTRY
+from analyzer_app import metrics
+from analyzer_app.data_analyzer import DataAnalyzer
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_instrument_view_counts_status_and_latency():
+    view = metrics.instrument_view("test_view")(lambda request, code: FakeResponse(code))
+    before_ok = sample("analyzer_requests_total", view="test_view", status="200")
+    before_missing = sample("analyzer_requests_total", view="test_view", status="404")
+    before_count = sample("analyzer_request_duration_seconds_count", view="test_view")
+    view(None, 200)
+    view(None, 404)
+    assert sample("analyzer_requests_total", view="test_view", status="200") == before_ok + 1
+    assert sample("analyzer_requests_total", view="test_view", status="404") == before_missing + 1
+    assert sample("analyzer_request_duration_seconds_count", view="test_view") == before_count + 2
+
+def test_instrument_view_counts_exceptions_as_server_errors():
+    def failing(request):
+        raise RuntimeError("boom")
+    view = metrics.instrument_view("test_failing_view")(failing)
+    before = sample("analyzer_requests_total", view="test_failing_view", status="500")
+    with pytest.raises(RuntimeError):
+        view(None)
+    assert sample("analyzer_requests_total", view="test_failing_view", status="500") == before + 1
+
+def test_run_analysis_records_stages_and_charts():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=50), "b": rng.normal(size=50)})
+    before_stage = sample("analyzer_stage_duration_seconds_count", stage="handle_outliers", engine="pandas")
+    before_charts = sample("analyzer_charts_rendered_total")
+    plots, _ = DataAnalyzer(df=df, engine="pandas").run_analysis()
+    assert sample("analyzer_stage_duration_seconds_count", stage="handle_outliers", engine="pandas") == before_stage + 1
+    assert sample("analyzer_charts_rendered_total") == before_charts + len(plots)
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def test_multiprocess_metrics_are_aggregated(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    record = "from analyzer_app import metrics; metrics.UPLOAD_ERRORS.labels('parse').inc()"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], env=env, cwd=ROOT, check=True)
+    render = "from analyzer_app import metrics; print(metrics.render_latest()[0].decode())"
+    output = subprocess.run([sys.executable, "-c", render], env=env, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    assert 'analyzer_upload_errors_total{reason="parse"} 2.0' in output
@@ -0,0 +1,124 @@
+import io
+import os
+import django
+import pytest
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "data_analyzer_project.settings")
+django.setup()
+
+from analyzer_app import artifacts
+from analyzer_app.artifacts import ArtifactStore
+from analyzer_app.data_analyzer import DataAnalyzer
+from analyzer_app.results_api import (
+    ApiError, MAX_PAGE_ROWS, encode_table, parse_columns, parse_page, select_statistics,
+)
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(5)
+    n = 400
+    x = rng.normal(size=n)
+    return pd.DataFrame({
+        "x": x,
+        "y": x * 2 + rng.normal(scale=0.1, size=n),
+        "z": rng.uniform(size=n),
+        "when": pd.date_range("2024-01-01", periods=n, freq="h"),
+        "segment": rng.choice(["A", "B", "C"], n),
+    })
+
+def test_parse_columns():
+    assert parse_columns(None) is None
+    assert parse_columns("") is None
+    assert parse_columns(" , ") is None
+    assert parse_columns("b, a,b") == ["b", "a"]
+
+def test_parse_page():
+    assert parse_page({}) == (0, 100_000)
+    assert parse_page({"offset": "10", "limit": "5"}) == (10, 5)
+    assert parse_page({"limit": str(MAX_PAGE_ROWS * 2)}) == (0, MAX_PAGE_ROWS)
+    for params in ({"offset": "-1"}, {"limit": "0"}, {"limit": "ten"}):
+        with pytest.raises(ApiError) as excinfo:
+            parse_page(params)
+        assert excinfo.value.status == 400
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_encode_table_round_trip(df, fmt):
+    body = encode_table(df, fmt)
+    if fmt == "arrow":
+        table = pa.ipc.open_stream(body).read_all()
+    else:
+        table = pq.read_table(io.BytesIO(body))
+    pd.testing.assert_frame_equal(table.to_pandas(), df, check_dtype=False)
+
+def test_encode_table_rejects_unknown_format(df):
+    with pytest.raises(ApiError):
+        encode_table(df, "csv")
+
+def test_statistics_are_json_friendly_and_selectable(df):
+    df.loc[:9, "z"] = np.nan
+    _, summaries = DataAnalyzer(df=df, n_jobs=1).run_analysis()
+    assert set(summaries) >= {"initial", "final", "statistics"}
+    assert "statistics" not in summaries["initial"]
+
+    initial = summaries["statistics"]["initial"]
+    assert initial["rows"] == len(df)
+    assert {col["name"]: col["missing"] for col in initial["columns"]}["z"] == 10
+    assert initial["describe"]["x"]["mean"] == pytest.approx(df["x"].mean())
+    # Datetime statistics become ISO strings, undefined ones None
+    assert isinstance(initial["describe"]["when"]["min"], str)
+    assert all(value is None or isinstance(value, (int, float, str))
+               for values in initial["describe"].values() for value in values.values())
+
+    top = summaries["statistics"]["final"]["top_correlations"][0]
+    assert {top["column"], top["other_column"]} == {"x", "y"}
+
+    selected = select_statistics(summaries["statistics"], ["z"])
+    assert [col["name"] for col in selected["final"]["columns"]] == ["z"]
+    assert list(selected["final"]["describe"]) == ["z"]
+    assert all("z" in (pair["column"], pair["other_column"]) for pair in selected["final"]["top_correlations"])
+    assert select_statistics(summaries["statistics"], None) is summaries["statistics"]
+
+def test_artifact_column_names_and_version(tmp_path, df):
+    store = ArtifactStore(tmp_path / "artifacts")
+    artifact_id = store.save_original(df)
+    assert store.column_names(artifact_id) == list(df.columns)
+    before = store.version(artifact_id)
+
+    processed = df.assign(extra=1)
+    store.save_processed(artifact_id, df, processed)
+    assert store.column_names(artifact_id, processed=True) == list(processed.columns)
+    assert store.version(artifact_id) != before
+
+def test_artifact_row_ranges_read_only_their_row_groups(tmp_path, df, monkeypatch):
+    monkeypatch.setattr(artifacts, "ROW_GROUP_ROWS", 50)
+    store = ArtifactStore(tmp_path / "artifacts")
+    artifact_id = store.save_original(df)
+    processed = df.assign(z=df["z"] * 2, extra=1)
+    store.save_processed(artifact_id, df, processed)
+    assert store.row_count(artifact_id) == store.row_count(artifact_id, processed=True) == len(df)
+
+    read = []
+    real_read_row_groups = pq.ParquetFile.read_row_groups
+    def spy(self, row_groups, *args, **kwargs):
+        read.append(list(row_groups))
+        return real_read_row_groups(self, row_groups, *args, **kwargs)
+    monkeypatch.setattr(pq.ParquetFile, "read_row_groups", spy)
+
+    page = store.load_processed(artifact_id, columns=["x", "z", "extra"], offset=120, limit=60)
+    pd.testing.assert_frame_equal(page, processed[["x", "z", "extra"]].iloc[120:180].reset_index(drop=True))
+    # Rows 120-179 lie in row groups 2 and 3, of the delta and of the original
+    assert read == [[2, 3], [2, 3]]
+
+    pd.testing.assert_frame_equal(store.load_original(artifact_id, offset=390, limit=50),
+                                  df.iloc[390:].reset_index(drop=True))
+    assert store.load_original(artifact_id, columns=["x"], offset=1000, limit=10).empty
+
+    # A full (sample) result has its own row count
+    store.save_processed(artifact_id, df, processed.head(70))
+    assert store.row_count(artifact_id, processed=True) == 70
+    pd.testing.assert_frame_equal(store.load_processed(artifact_id, offset=60, limit=100),
+                                  processed.iloc[60:70].reset_index(drop=True))